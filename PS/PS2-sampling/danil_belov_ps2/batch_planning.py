@@ -0,0 +1,282 @@
+"""
+Batch planning of many start/goal pairs in one obstacle layout.
+
+All queries share one lazily validated roadmap and one edge collision cache: roadmap edges are only
+collision checked when a query's shortest path uses them, and the result is reused by every later
+query. Start and goal connections of all queries are validated together in one batched check.
+Every edge is checked at the resolution of the RRT edge check (at most max_step_deg of joint motion
+between checked configurations), whatever its length, so long edges can't step over thin obstacles.
+"""
+
+import heapq
+import os
+import time
+import numpy as np
+
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Tuple
+from environment import ManipulatorEnv
+
+
+def wrap_angles(angles: np.ndarray) -> np.ndarray:
+    return ((angles + 180) % 360) - 180
+
+
+def pairwise_l1(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """
+    :return: L1 distances with angle wraparound between all rows of a and b. Shape: (len(a), len(b)).
+    """
+    return np.sum(np.abs(wrap_angles(a[:, None, :] - b[None, :, :])), axis=2)
+
+
+def edges_in_collision(env: ManipulatorEnv,
+                       a: np.ndarray,
+                       b: np.ndarray,
+                       max_step_deg: float = 0.2,
+                       n_steps: int = 50) -> np.ndarray:
+    """
+    Checks the straight (shortest angle) edges a[i] -> b[i] for all edges at once. The number of checked
+    configurations of an edge grows with its largest joint change, so that no joint moves more than
+    max_step_deg between two of them (0.2 degrees is the resolution of the RRT edge check, 50 steps over
+    a 10 degree step): every edge is split into pieces of at most n_steps * max_step_deg degrees, and all
+    pieces are swept with n_steps steps in one batched check.
+    :return: boolean array, True where the edge is in collision. Shape: (n_edges,).
+    """
+    a = np.asarray(a, dtype=float).reshape(-1, ManipulatorEnv.N_LINKS)
+    b = np.asarray(b, dtype=float).reshape(-1, ManipulatorEnv.N_LINKS)
+    if len(a) == 0:
+        return np.zeros(0, dtype=bool)
+    diffs = wrap_angles(b - a)
+    n_pieces = np.maximum(np.ceil(np.abs(diffs).max(axis=1) / (n_steps * max_step_deg)), 1).astype(np.int64)
+    edge = np.repeat(np.arange(len(a)), n_pieces)
+    piece = np.arange(len(edge)) - np.repeat(np.cumsum(n_pieces) - n_pieces, n_pieces)
+    t0 = (piece / n_pieces[edge])[:, None]
+    t1 = ((piece + 1) / n_pieces[edge])[:, None]
+    collision = env.check_edges_batch(wrap_angles(a[edge] + t0 * diffs[edge]),
+                                      wrap_angles(a[edge] + t1 * diffs[edge]), n_steps)
+    return np.logical_or.reduceat(collision, np.cumsum(n_pieces) - n_pieces)
+
+
+class BatchPlanner:
+
+    def __init__(self,
+                 env: ManipulatorEnv,
+                 n_roadmap_nodes: int = 2000,
+                 k_neighbors: int = 10,
+                 max_step_deg: float = 0.2,
+                 seed: Optional[int] = None):
+        """
+        :param env: manipulator environment shared by all queries
+        :param n_roadmap_nodes: number of collision-free roadmap configurations
+        :param k_neighbors: each roadmap node (and each start/goal) is connected to this many nearest nodes;
+            the roadmap is undirected, so a node also has an edge to every node it is a nearest neighbor of
+        :param max_step_deg: max joint change between the configurations checked along an edge
+            (see edges_in_collision)
+        :param seed: seed for roadmap sampling
+        """
+        self._env = env
+        self._k_neighbors = k_neighbors
+        self._max_step_deg = max_step_deg
+        self._rng = np.random.default_rng(seed)
+        self._nodes = self._sample_free(n_roadmap_nodes)
+        self._neighbors, self._neighbor_costs = self._connect(self._nodes)
+        self._edge_cache: Dict[Tuple[int, int], bool] = {}  # (i, j), i < j -> in collision
+
+    def _sample_free(self, n: int) -> np.ndarray:
+        samples = []
+        n_found = 0
+        while n_found < n:
+            candidates = self._rng.uniform(-180, 180, (2 * (n - n_found) + 16, ManipulatorEnv.N_LINKS))
+            free = candidates[~self._env.check_collision_batch(candidates)]
+            samples.append(free)
+            n_found += len(free)
+        return np.concatenate(samples)[:n]
+
+    def _connect(self, nodes: np.ndarray) -> Tuple[List[np.ndarray], List[np.ndarray]]:
+        # kNN edges in both directions, so the graph matches the undirected edge cache
+        k = min(self._k_neighbors, len(nodes) - 1)
+        nearest = np.empty((len(nodes), k), dtype=np.int64)
+        for i in range(0, len(nodes), 512):
+            dist = pairwise_l1(nodes[i:i + 512], nodes)
+            dist[np.arange(len(dist)), np.arange(i, i + len(dist))] = np.inf
+            nearest[i:i + 512] = np.argpartition(dist, k - 1, axis=1)[:, :k]
+        rows = np.repeat(np.arange(len(nodes)), k)
+        edges = np.unique(np.concatenate([rows * len(nodes) + nearest.ravel(),
+                                          nearest.ravel() * len(nodes) + rows]))
+        rows, cols = np.divmod(edges, len(nodes))
+        costs = np.sum(np.abs(wrap_angles(nodes[rows] - nodes[cols])), axis=1)
+        bounds = np.searchsorted(rows, np.arange(len(nodes) + 1))
+        return ([cols[lo:hi] for lo, hi in zip(bounds[:-1], bounds[1:])],
+                [costs[lo:hi] for lo, hi in zip(bounds[:-1], bounds[1:])])
+
+    @property
+    def roadmap_size(self) -> int:
+        return len(self._nodes)
+
+    def plan_batch(self,
+                   starts: np.ndarray,
+                   goals: np.ndarray,
+                   n_workers: Optional[int] = 1) -> Tuple[List[Optional[np.ndarray]], List[dict]]:
+        """
+        Plans all start/goal pairs.
+
+        :param starts: start configurations in degrees. Shape: (n_queries, 4).
+        :param goals: goal configurations in degrees. Shape: (n_queries, 4).
+        :param n_workers: number of processes, queries are split into contiguous chunks. 1 plans in this
+            process, None uses all cores. Each worker keeps its own copy of the edge cache.
+        :return: path for every query (array of shape (n_states, 4), None if not solved) and per-query stats
+        """
+        starts = np.asarray(starts, dtype=float).reshape(-1, ManipulatorEnv.N_LINKS)
+        goals = np.asarray(goals, dtype=float).reshape(-1, ManipulatorEnv.N_LINKS)
+        assert starts.shape == goals.shape
+        if n_workers is None:
+            n_workers = os.cpu_count() or 1
+        n_workers = min(n_workers, len(starts))
+        if n_workers <= 1:
+            return self._plan_chunk(starts, goals)
+
+        bounds = np.linspace(0, len(starts), n_workers + 1).astype(int)
+        paths, stats = [], []
+        with ProcessPoolExecutor(max_workers=n_workers, initializer=_init_worker, initargs=(self,)) as executor:
+            futures = [executor.submit(_plan_chunk_in_worker, starts[lo:hi], goals[lo:hi])
+                       for lo, hi in zip(bounds[:-1], bounds[1:])]
+            for future in futures:
+                chunk_paths, chunk_stats = future.result()
+                paths.extend(chunk_paths)
+                stats.extend(chunk_stats)
+        return paths, stats
+
+    def _plan_chunk(self, starts: np.ndarray, goals: np.ndarray) -> Tuple[List[Optional[np.ndarray]], List[dict]]:
+        n_queries = len(starts)
+        chunk_start_time = time.perf_counter()
+        k = min(self._k_neighbors, len(self._nodes))
+
+        # Vectorized connection attempts for all queries: direct start -> goal edges plus edges to the
+        # k nearest roadmap nodes of every start and goal, validated in one batched check.
+        endpoints_in_collision = self._env.check_collision_batch(np.concatenate([starts, goals]))
+        start_dist, goal_dist = pairwise_l1(starts, self._nodes), pairwise_l1(goals, self._nodes)
+        start_nearest = np.argpartition(start_dist, k - 1, axis=1)[:, :k]
+        goal_nearest = np.argpartition(goal_dist, k - 1, axis=1)[:, :k]
+        edge_from = np.concatenate([starts, np.repeat(starts, k, axis=0), np.repeat(goals, k, axis=0)])
+        edge_to = np.concatenate([goals, self._nodes[start_nearest.ravel()], self._nodes[goal_nearest.ravel()]])
+        edge_collision = edges_in_collision(self._env, edge_from, edge_to, self._max_step_deg)
+        direct_collision = edge_collision[:n_queries]
+        start_edge_free = ~edge_collision[n_queries:n_queries * (k + 1)].reshape(n_queries, k)
+        goal_edge_free = ~edge_collision[n_queries * (k + 1):].reshape(n_queries, k)
+        connection_time = (time.perf_counter() - chunk_start_time) / max(n_queries, 1)
+
+        paths, stats = [], []
+        for q in range(n_queries):
+            query_start_time = time.perf_counter()
+            n_cache_before = len(self._edge_cache)
+            path, method = None, "failed"
+            if endpoints_in_collision[q] or endpoints_in_collision[n_queries + q]:
+                method = "invalid"
+            elif not direct_collision[q]:
+                path, method = np.stack([starts[q], goals[q]]), "direct"
+            else:
+                sources = {int(n): start_dist[q, n] for n in start_nearest[q][start_edge_free[q]]}
+                targets = {int(n): goal_dist[q, n] for n in goal_nearest[q][goal_edge_free[q]]}
+                node_path = self._lazy_shortest_path(sources, targets)
+                if node_path is not None:
+                    path = np.concatenate([starts[q][None], self._nodes[node_path], goals[q][None]])
+                    method = "roadmap"
+            paths.append(path)
+            stats.append({
+                'solved': path is not None,
+                'method': method,
+                'path_states': 0 if path is None else len(path),
+                'path_length': np.nan if path is None else float(np.sum(np.abs(wrap_angles(np.diff(path, axis=0))))),
+                'new_edge_checks': len(self._edge_cache) - n_cache_before,
+                'time_s': connection_time + time.perf_counter() - query_start_time,
+            })
+        return paths, stats
+
+    def _lazy_shortest_path(self, sources: Dict[int, float], targets: Dict[int, float]) -> Optional[List[int]]:
+        # Lazy PRM: search with unknown edges assumed free, check only the edges of the found path,
+        # and search again if one of them turns out to be in collision.
+        while True:
+            node_path = self._shortest_path(sources, targets)
+            if node_path is None:
+                return None
+            unknown = [(min(i, j), max(i, j)) for i, j in zip(node_path[:-1], node_path[1:])
+                       if (min(i, j), max(i, j)) not in self._edge_cache]
+            if unknown:
+                edges = np.array(unknown)
+                collision = edges_in_collision(self._env, self._nodes[edges[:, 0]], self._nodes[edges[:, 1]],
+                                               self._max_step_deg)
+                self._edge_cache.update(zip(unknown, collision.tolist()))
+                if collision.any():
+                    continue
+            return node_path
+
+    def _shortest_path(self, sources: Dict[int, float], targets: Dict[int, float]) -> Optional[List[int]]:
+        # Dijkstra from all sources at once; a target is reached with its goal connection cost added
+        dist = dict(sources)
+        parent = {node: -1 for node in sources}
+        queue = [(cost, node) for node, cost in sources.items()]
+        heapq.heapify(queue)
+        best_cost, best_target = np.inf, None
+        done = set()
+        while queue:
+            cost, node = heapq.heappop(queue)
+            if cost >= best_cost:
+                break
+            if node in done:
+                continue
+            done.add(node)
+            if node in targets and cost + targets[node] < best_cost:
+                best_cost, best_target = cost + targets[node], node
+            for neighbor, edge_cost in zip(self._neighbors[node], self._neighbor_costs[node]):
+                neighbor = int(neighbor)
+                if self._edge_cache.get((min(node, neighbor), max(node, neighbor)), False):
+                    continue
+                new_cost = cost + edge_cost
+                if new_cost < dist.get(neighbor, np.inf):
+                    dist[neighbor] = new_cost
+                    parent[neighbor] = node
+                    heapq.heappush(queue, (new_cost, neighbor))
+        if best_target is None:
+            return None
+        node_path = [best_target]
+        while parent[node_path[-1]] != -1:
+            node_path.append(parent[node_path[-1]])
+        node_path.reverse()
+        return node_path
+
+
+_worker_planner: Optional[BatchPlanner] = None
+
+
+def _init_worker(planner: BatchPlanner):
+    global _worker_planner
+    _worker_planner = planner
+
+
+def _plan_chunk_in_worker(starts: np.ndarray, goals: np.ndarray):
+    return _worker_planner._plan_chunk(starts, goals)
+
+
+if __name__ == '__main__':
+    import pickle
+
+    with open("data.pickle", "rb") as handle:
+        data = pickle.load(handle)
+    env = ManipulatorEnv(obstacles=np.array(data["obstacles"]),
+                         initial_state=None,
+                         collision_threshold=data["collision_threshold"])
+
+    build_start_time = time.perf_counter()
+    planner = BatchPlanner(env, seed=0)
+    print(f"Roadmap: {planner.roadmap_size} nodes in {time.perf_counter() - build_start_time:.2f} s")
+
+    rng = np.random.default_rng(1)
+    queries = rng.uniform(-180, 180, (2000, ManipulatorEnv.N_LINKS))
+    queries = queries[~env.check_collision_batch(queries)][:400]
+    starts, goals = queries[:200], queries[200:]
+    for n_workers in (1, None):
+        batch_start_time = time.perf_counter()
+        paths, stats = planner.plan_batch(starts, goals, n_workers=n_workers)
+        elapsed = time.perf_counter() - batch_start_time
+        n_solved = sum(s['solved'] for s in stats)
+        print(f"workers={n_workers}: {n_solved}/{len(stats)} solved, {len(stats) / elapsed:.1f} queries/s")
@@ -0,0 +1,74 @@
+import argparse
+import pickle
+import numpy as np
+
+from angle_util import angle_difference
+from environment import State, ManipulatorEnv
+from rrt import RRTPlanner
+from samplers import UniformSampler, GaussianSampler, BridgeSampler, InformedSampler, MixtureSampler
+
+
+def l1_distance(state1, state2):
+    return np.sum(np.abs(angle_difference(state2.angles, state1.angles)))
+
+
+def make_samplers(env):
+    """
+    :return: name -> (sampler, anytime). Informed sampling only changes anything after the first solution,
+        so it is run in anytime mode, next to its base sampler in anytime mode with the same time budget.
+    """
+    def bridge():
+        return MixtureSampler([BridgeSampler(env), UniformSampler()], [0.5, 0.5])
+
+    return {
+        "uniform": (UniformSampler(), False),
+        "gaussian": (MixtureSampler([GaussianSampler(env), UniformSampler()], [0.7, 0.3]), False),
+        "bridge": (bridge(), False),
+        "bridge, anytime": (bridge(), True),
+        "informed(bridge)": (InformedSampler(env, bridge()), True),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compares RRT sampling strategies on data.pickle")
+    parser.add_argument("--trials", type=int, default=5)
+    parser.add_argument("--max-iterations", type=int, default=10000)
+    parser.add_argument("--anytime-budget", type=float, default=20.0,
+                        help="time budget in seconds of the anytime runs, which keep improving the path")
+    args = parser.parse_args()
+
+    with open("data.pickle", "rb") as handle:
+        data = pickle.load(handle)
+
+    start_state = State(np.array(data["start_state"]))
+    goal_state = State(np.array(data["goal_state"]))
+    env = ManipulatorEnv(obstacles=np.array(data["obstacles"]),
+                         initial_state=start_state,
+                         collision_threshold=data["collision_threshold"])
+
+    results = {}
+    for name, (sampler, anytime) in make_samplers(env).items():
+        results[name] = []
+        for seed in range(args.trials):
+            print(f"\n{name}, seed {seed}")
+            planner = RRTPlanner(env, distance_fn=l1_distance, max_angle_step=10.0, sampler=sampler)
+            planner.plan(start_state, goal_state, max_iterations=args.max_iterations, goal_bias=0.1, seed=seed,
+                         anytime=anytime, time_budget_s=args.anytime_budget if anytime else None)
+            results[name].append(planner.get_run_stats())
+
+    # anytime runs use their whole budget, so compare them by path cost rather than iterations and time
+    print(f"\n{'sampler':<20}{'solved':>8}{'median iters':>14}{'mean iters':>12}{'mean time, s':>14}"
+          f"{'mean cost':>12}")
+    for name, runs in results.items():
+        solved = [run for run in runs if run['goal_reached']]
+        iterations = [run['iterations'] for run in solved]
+        median_iterations = f"{np.median(iterations):.0f}" if solved else "-"
+        mean_iterations = f"{np.mean(iterations):.0f}" if solved else "-"
+        mean_time = np.mean([run['planning_time_s'] for run in runs])
+        mean_cost = f"{np.mean([run['path_cost'] for run in solved]):.1f}" if solved else "-"
+        print(f"{name:<20}{len(solved):>5}/{len(runs):<2}{median_iterations:>14}{mean_iterations:>12}"
+              f"{mean_time:>14.2f}{mean_cost:>12}")
+
+
+if __name__ == '__main__':
+    main()
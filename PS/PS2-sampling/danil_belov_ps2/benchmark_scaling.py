@@ -0,0 +1,98 @@
+import argparse
+import csv
+import time
+import tracemalloc
+import numpy as np
+
+from angle_util import angle_difference
+from environment import State, ManipulatorEnv
+from rrt import RRTPlanner, weighted_l1_distance_batch
+from scenarios import generate_scenario
+
+CSV_FIELDS = ['n_obstacles', 'n_links', 'seed', 'batch_size', 'solved', 'iterations', 'tree_size', 'path_states',
+              'time_to_solution_s', 'collision_checks', 'collision_check_us', 'edge_check_us', 'peak_memory_mb']
+
+
+def l1_distance(state1, state2):
+    return np.sum(np.abs(angle_difference(state2.angles, state1.angles)))
+
+
+def run_trial(n_obstacles: int, n_links: int, seed: int, max_iterations: int, track_memory: bool,
+              batch_size: int = 64) -> dict:
+    scenario = generate_scenario(n_obstacles, n_links=n_links, seed=seed)
+    start_state = State(np.array(scenario["start_state"]))
+    goal_state = State(np.array(scenario["goal_state"]))
+    env = ManipulatorEnv(obstacles=np.array(scenario["obstacles"]),
+                         initial_state=start_state,
+                         collision_threshold=scenario["collision_threshold"])
+    planner = RRTPlanner(env, distance_fn=l1_distance, max_angle_step=10.0,
+                         batch_distance_fn=weighted_l1_distance_batch())
+
+    if track_memory:
+        tracemalloc.start()
+    plan = planner.plan(start_state, goal_state, max_iterations=max_iterations, goal_bias=0.1, seed=seed,
+                        batch_size=batch_size)
+    peak_memory = tracemalloc.get_traced_memory()[1] if track_memory else 0
+    if track_memory:
+        tracemalloc.stop()
+
+    # time per configuration and per edge of the batched checks the planner uses, measured separately
+    # from planning (edges are max_angle_step long, as in the tree)
+    n_checks_planning = env.n_collision_checks
+    rng = np.random.default_rng(seed)
+    probes = rng.uniform(-180, 180, (1000, n_links))
+    probe_start_time = time.perf_counter()
+    env.check_collision_batch(probes)
+    collision_check_time = (time.perf_counter() - probe_start_time) / len(probes)
+    edge_ends = probes + rng.uniform(-10.0, 10.0, probes.shape)
+    probe_start_time = time.perf_counter()
+    env.check_edges_batch(probes, edge_ends)
+    edge_check_time = (time.perf_counter() - probe_start_time) / len(probes)
+
+    stats = planner.get_run_stats()
+    return {
+        'n_obstacles': n_obstacles,
+        'n_links': n_links,
+        'seed': seed,
+        'batch_size': batch_size,
+        'solved': stats['goal_reached'],
+        'iterations': stats['iterations'],
+        'tree_size': stats['tree_size'],
+        'path_states': len(plan),
+        'time_to_solution_s': stats['planning_time_s'],
+        'collision_checks': n_checks_planning,
+        'collision_check_us': collision_check_time * 1e6,
+        'edge_check_us': edge_check_time * 1e6,
+        'peak_memory_mb': peak_memory / 2 ** 20,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="RRT scaling with obstacle count and DOF on generated scenarios")
+    parser.add_argument("--obstacles", type=int, nargs="+", default=[10, 100, 1000, 10000])
+    parser.add_argument("--links", type=int, nargs="+", default=[3, 4, 6])
+    parser.add_argument("--trials", type=int, default=3)
+    parser.add_argument("--max-iterations", type=int, default=2000)
+    parser.add_argument("--batch-size", type=int, default=64,
+                        help="configurations sampled and extended per batched tree growth step")
+    parser.add_argument("--no-memory", action="store_true",
+                        help="don't trace memory (tracemalloc slows planning down)")
+    parser.add_argument("--output", default="scaling.csv")
+    args = parser.parse_args()
+
+    with open(args.output, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=CSV_FIELDS)
+        writer.writeheader()
+        for n_links in args.links:
+            for n_obstacles in args.obstacles:
+                for seed in range(args.trials):
+                    print(f"\n{n_obstacles} obstacles, {n_links} links, seed {seed}")
+                    row = run_trial(n_obstacles, n_links, seed, args.max_iterations, not args.no_memory,
+                                    args.batch_size)
+                    writer.writerow(row)
+                    f.flush()
+    print(f"Saved: {args.output}")
+
+
+if __name__ == '__main__':
+    main()
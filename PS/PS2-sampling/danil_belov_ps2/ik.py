@@ -0,0 +1,176 @@
+"""
+End-effector goal regions and vectorized inverse kinematics of the planar manipulator.
+
+Goal configurations for a workspace goal (a point plus a tolerance) are found by damped least squares
+IK started from many random seeds at once, and collision free solutions are handed to RRTPlanner.plan
+as a multi-goal set:
+    goals = sample_goal_states(env, GoalRegion([2.0, 1.5], tolerance=0.05), n_goals=200, seed=0)
+    plan = planner.plan(start_state, goals)
+"""
+
+import numpy as np
+
+from typing import List, Optional, Tuple
+from environment import State, ManipulatorEnv
+
+
+def wrap_angles(angles: np.ndarray) -> np.ndarray:
+    return ((angles + 180) % 360) - 180
+
+
+def end_effector_batch(angles: np.ndarray) -> np.ndarray:
+    """
+    :param angles: configurations in degrees. Shape: (N, n_links).
+    :return: end effector (last joint) positions. Shape: (N, 2).
+    """
+    return State.joint_positions_batch(angles)[:, -1, :]
+
+
+class GoalRegion:
+
+    def __init__(self, position: np.ndarray, tolerance: float = 0.05):
+        """
+        Disc of end effector positions around a workspace point.
+
+        :param position: (x, y) of the goal point
+        :param tolerance: max distance of the end effector from the point
+        """
+        self.position = np.asarray(position, dtype=float)
+        self.tolerance = tolerance
+
+    def sample_points(self, n: int, rng: np.random.Generator) -> np.ndarray:
+        """
+        :return: n points uniformly distributed in the region. Shape: (n, 2).
+        """
+        r = self.tolerance * np.sqrt(rng.uniform(size=n))
+        phi = rng.uniform(0, 2 * np.pi, n)
+        return self.position + np.stack([r * np.cos(phi), r * np.sin(phi)], axis=1)
+
+    def contains_batch(self, angles: np.ndarray) -> np.ndarray:
+        """
+        :param angles: configurations in degrees. Shape: (N, n_links).
+        :return: True where the end effector is inside the region. Shape: (N,).
+        """
+        return np.linalg.norm(end_effector_batch(angles) - self.position, axis=1) <= self.tolerance
+
+
+def solve_ik_batch(targets: np.ndarray,
+                   seeds: np.ndarray,
+                   damping: float = 0.1,
+                   max_iterations: int = 50,
+                   tolerance: float = 1e-4,
+                   max_step_deg: float = 20.0) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Damped least squares IK of the unit-link chain, all seeds solved at once:
+        dq = J^T (J J^T + damping^2 I)^-1 (target - p(q))
+    Solved rows are frozen, iterations stop when every row is solved.
+
+    :param targets: end effector target of every seed. Shape: (N, 2).
+    :param seeds: initial configurations in degrees. Shape: (N, n_links).
+    :param damping: damping factor, keeps the steps bounded near singular (stretched) configurations
+    :param tolerance: end effector error at which a row counts as solved
+    :param max_step_deg: max change of any joint in one iteration, in degrees
+    :return: configurations in degrees (shape: (N, n_links)) and their end effector errors (shape: (N,))
+    """
+    q = np.deg2rad(np.asarray(seeds, dtype=float))
+    max_step = np.deg2rad(max_step_deg)
+    active = np.arange(len(q))
+    errors = np.full(len(q), np.inf)
+    for _ in range(max_iterations):
+        phi = np.cumsum(q[active], axis=1)
+        cos, sin = np.cos(phi), np.sin(phi)
+        e = targets[active] - np.stack([cos.sum(axis=1), sin.sum(axis=1)], axis=1)
+        errors[active] = np.linalg.norm(e, axis=1)
+        unsolved = errors[active] > tolerance
+        active, cos, sin, e = active[unsolved], cos[unsolved], sin[unsolved], e[unsolved]
+        if len(active) == 0:
+            break
+        # joint i moves every link from i on: dp/dq_i = sum_{k >= i} (-sin(phi_k), cos(phi_k))
+        jx = -np.cumsum(sin[:, ::-1], axis=1)[:, ::-1]
+        jy = np.cumsum(cos[:, ::-1], axis=1)[:, ::-1]
+        # (J J^T + damping^2 I)^-1 e with the closed-form inverse of the 2x2 matrix
+        a = np.sum(jx * jx, axis=1) + damping ** 2
+        b = np.sum(jx * jy, axis=1)
+        c = np.sum(jy * jy, axis=1) + damping ** 2
+        det = a * c - b * b
+        yx = (c * e[:, 0] - b * e[:, 1]) / det
+        yy = (a * e[:, 1] - b * e[:, 0]) / det
+        q[active] += np.clip(jx * yx[:, None] + jy * yy[:, None], -max_step, max_step)
+    return wrap_angles(np.rad2deg(q)), errors
+
+
+def sample_goal_configs(env: ManipulatorEnv,
+                        region: GoalRegion,
+                        n_goals: int,
+                        n_seeds: Optional[int] = None,
+                        max_rounds: int = 10,
+                        n_links: int = ManipulatorEnv.N_LINKS,
+                        seed: Optional[int] = None) -> np.ndarray:
+    """
+    Collision free configurations with the end effector in the region.
+
+    Every round solves IK from random configurations towards random points of the region and keeps the
+    solutions inside the region that pass a batched collision check. Later rounds are sized by the share of
+    seeds accepted so far, so that one more round is usually enough.
+
+    :param n_goals: number of configurations to return; fewer are returned if max_rounds is not enough
+        (e.g. the region is out of reach or blocked by obstacles)
+    :param n_seeds: IK seeds of the first round, 4 * n_goals by default
+    :return: goal configurations in degrees. Shape: (n_found, n_links), n_found <= n_goals.
+    """
+    rng = np.random.default_rng(seed)
+    n_round = n_seeds or 4 * n_goals
+    goals = []
+    n_found = 0
+    n_tried = 0
+    for _ in range(max_rounds):
+        if n_found >= n_goals:
+            break
+        seeds = rng.uniform(-180, 180, (n_round, n_links))
+        angles, _ = solve_ik_batch(region.sample_points(n_round, rng), seeds)
+        angles = angles[region.contains_batch(angles)]
+        angles = angles[~env.check_collision_batch(angles)]
+        goals.append(angles)
+        n_found += len(angles)
+        n_tried += n_round
+        acceptance = max(n_found / n_tried, 0.01)
+        n_round = int(np.ceil(1.2 * (n_goals - n_found) / acceptance))
+    return np.concatenate(goals)[:n_goals] if goals else np.empty((0, n_links))
+
+
+def sample_goal_states(env: ManipulatorEnv,
+                       region: GoalRegion,
+                       n_goals: int,
+                       **kwargs) -> List[State]:
+    """
+    sample_goal_configs() as a list of States, the goal set format of RRTPlanner.plan.
+    """
+    return [State(angles) for angles in sample_goal_configs(env, region, n_goals, **kwargs)]
+
+
+if __name__ == '__main__':
+    import pickle
+    import time
+    from angle_util import angle_difference
+    from rrt import RRTPlanner, weighted_l1_distance_batch
+
+    with open("data.pickle", "rb") as handle:
+        data = pickle.load(handle)
+    start_state = State(np.array(data["start_state"]))
+    env = ManipulatorEnv(obstacles=np.array(data["obstacles"]),
+                         initial_state=start_state,
+                         collision_threshold=data["collision_threshold"])
+    # the end effector position of the assignment's goal configuration as a workspace goal
+    region = GoalRegion(State(np.array(data["goal_state"])).joints[-1], tolerance=0.05)
+
+    env.check_collision_batch(start_state.angles[None])  # loads the compiled kernels before timing
+    ik_start_time = time.perf_counter()
+    goal_states = sample_goal_states(env, region, n_goals=200, seed=0)
+    print(f"{len(goal_states)} goal configurations in {(time.perf_counter() - ik_start_time) * 1000:.1f} ms")
+
+    planner = RRTPlanner(env,
+                         distance_fn=lambda s1, s2: np.sum(np.abs(angle_difference(s2.angles, s1.angles))),
+                         batch_distance_fn=weighted_l1_distance_batch())
+    plan = planner.plan(start_state, goal_states, seed=0, batch_size=64)
+    print(f"Plan: {len(plan)} states, stats: {planner.get_run_stats()}")
+    print(f"End effector in the region: {region.contains_batch(plan[-1].angles[None])[0]}")
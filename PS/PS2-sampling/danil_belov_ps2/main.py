@@ -1,13 +1,18 @@
+import argparse
 import numpy as np
 import pickle
 from environment import State, ManipulatorEnv
 from rrt import RRTPlanner
-from video_util import animate_plan
+from plan_io import save_run, run_key
 from angle_util import angle_difference
 
 
 # You are free to change any interfaces for your needs.
 
+# Seed and parameters of the saved rrt_run.npz, shared with run_all_tasks.task_2b so that it can reuse the run
+RUN_SEED = 42
+RUN_PARAMS = dict(max_angle_step=10.0, max_iterations=10000, goal_bias=0.1)
+
 
 def l1_distance(state1, state2):
     return np.sum(np.abs(angle_difference(state2.angles, state1.angles)))
@@ -24,7 +29,7 @@ def weighted_distance(weights: np.ndarray = None):
     return dist_fn
 
 
-def main():
+def main(video: bool = True):
     with open("data.pickle", "rb") as handle:
         data = pickle.load(handle)
 
@@ -34,18 +39,29 @@ def main():
                          initial_state=start_state,
                          collision_threshold=data["collision_threshold"])
 
-    planner = RRTPlanner(env, distance_fn=l1_distance, max_angle_step=10.0)
+    planner = RRTPlanner(env, distance_fn=l1_distance, max_angle_step=RUN_PARAMS['max_angle_step'])
 
-    plan = planner.plan(start_state, goal_state)
+    plan = planner.plan(start_state, goal_state, max_iterations=RUN_PARAMS['max_iterations'],
+                        goal_bias=RUN_PARAMS['goal_bias'], seed=RUN_SEED)
     print(f"Tree size: {planner.get_tree_size()} nodes")
     print(f"Path length: {len(plan)} states")
+    save_run("rrt_run.npz", planner, plan,
+             key=run_key(env, start_state, goal_state, RUN_SEED, **RUN_PARAMS))
+    print("Run saved: rrt_run.npz")
+
+    if video:
+        from video_util import animate_plan  # cv2 and matplotlib are only loaded for the video
 
-    print("Generating video...")
-    animate_plan(env, plan, video_output_file="solve_4R.mp4")
-    print("Video saved: solve_4R.mp4")
+        print("Generating video...")
+        animate_plan(env, plan, video_output_file="solve_4R.mp4")
+        print("Video saved: solve_4R.mp4")
 
 
 if __name__ == '__main__':
-    main()
+    parser = argparse.ArgumentParser(description="Plan the data.pickle problem with RRT")
+    parser.add_argument("--no-video", action="store_true",
+                        help="only plan and save the run, without loading any rendering dependencies")
+    args = parser.parse_args()
+    main(video=not args.no_video)
 
 
@@ -0,0 +1,156 @@
+import hashlib
+import struct
+import zipfile
+import numpy as np
+
+from typing import List, Optional
+from environment import State, ManipulatorEnv
+from rrt import RRTPlanner
+
+# Run statistics are kept as a single record of a structured array, so they load without pickle.
+STATS_DTYPE = np.dtype([
+    ('iterations', np.int64),
+    ('goal_reached', np.bool_),
+    ('status', 'U8'),
+    ('path_cost', np.float64),
+    ('tree_size', np.int64),
+    ('peak_tree_nodes', np.int64),
+    ('peak_tree_memory_mb', np.float64),
+    ('pruned_nodes', np.int64),
+    ('goal_connection_attempts', np.int64),
+    ('closest_goal_distance', np.float64),
+    ('planning_time_s', np.float64),
+])
+NO_SEED = -1
+
+
+class PlannerRun:
+
+    def __init__(self,
+                 plan_angles: np.ndarray,
+                 tree_angles: np.ndarray,
+                 tree_parents: np.ndarray,
+                 seed: Optional[int],
+                 stats: np.ndarray,
+                 key: Optional[str] = None):
+        """
+        Everything RRTPlanner produced in one plan() call.
+
+        :param plan_angles: angles of the plan states. Shape: (n_plan, 4).
+        :param tree_angles: angles of all tree nodes in insertion order. Shape: (n_nodes, 4).
+        :param tree_parents: parent index of each tree node, -1 for the root. Shape: (n_nodes,).
+        :param seed: seed used for np.random, None if the run was not seeded
+        :param stats: run statistics, a record of STATS_DTYPE
+        :param key: run_key() of the problem and parameters the run was planned with, None if not recorded
+        """
+        self.plan_angles = plan_angles
+        self.tree_angles = tree_angles
+        self.tree_parents = tree_parents
+        self.seed = seed
+        self.stats = stats
+        self.key = key
+
+    def plan_states(self) -> List[State]:
+        return [State(np.array(angles)) for angles in self.plan_angles]
+
+    def path_length(self) -> float:
+        """
+        :return: L1 length of the plan in degrees, taking angle wraparound into account
+        """
+        diffs = np.diff(self.plan_angles, axis=0)
+        return float(np.sum(np.abs((diffs + 180) % 360 - 180)))
+
+
+def run_key(env: ManipulatorEnv, start_state: State, goal_state: State, seed: Optional[int], **params) -> str:
+    """
+    Fingerprint of a planning problem and its parameters, to tell whether a saved run can be reused.
+
+    :param params: planner and plan() parameters the run depends on, e.g. max_angle_step=10.0
+    :return: hex digest of the obstacles, collision threshold, start, goal, seed and params
+    """
+    digest = hashlib.sha1()
+    digest.update(np.ascontiguousarray(env.obstacles, dtype=np.float64).tobytes())
+    digest.update(np.float64(env.collision_threshold).tobytes())
+    digest.update(np.asarray(start_state.angles, dtype=np.float64).tobytes())
+    digest.update(np.asarray(goal_state.angles, dtype=np.float64).tobytes())
+    digest.update(repr((seed, sorted(params.items()))).encode())
+    return digest.hexdigest()
+
+
+def save_run(filename: str, planner: RRTPlanner, plan: List[State], key: Optional[str] = None) -> None:
+    """
+    Saves the plan, the full tree, the seed and the run statistics of the planner's last plan() call.
+    The file is an uncompressed .npz, so load_run() can memory-map its arrays.
+
+    :param key: run_key() of the run, stored so that callers can check a saved run before reusing it
+    """
+    tree_angles, tree_parents = planner.get_tree()
+    stats = _stats_record(planner.get_run_stats())
+    seed = planner.get_seed()
+    np.savez(filename,
+             plan_angles=np.array([state.angles for state in plan]).reshape(len(plan), -1),
+             tree_angles=tree_angles,
+             tree_parents=tree_parents,
+             seed=np.int64(NO_SEED if seed is None else seed),
+             stats=stats,
+             key=np.str_('' if key is None else key))
+
+
+def load_run(filename: str, mmap: bool = True) -> PlannerRun:
+    """
+    Loads a run saved with save_run().
+
+    :param mmap: if True, the plan and tree arrays are memory-mapped read-only instead of being read
+        into memory, which keeps post-processing of large sweeps cheap
+    """
+    if mmap:
+        arrays = _mmap_npz(filename)
+    else:
+        with np.load(filename) as data:
+            arrays = {name: data[name] for name in data.files}
+    seed = int(arrays['seed'])
+    key = str(arrays['key']) if 'key' in arrays else ''
+    return PlannerRun(plan_angles=arrays['plan_angles'],
+                      tree_angles=arrays['tree_angles'],
+                      tree_parents=arrays['tree_parents'],
+                      seed=None if seed == NO_SEED else seed,
+                      stats=_stats_record(arrays['stats']),
+                      key=key or None)
+
+
+def _stats_record(values) -> np.ndarray:
+    # values is a stats dict or a saved record; fields missing in runs saved by older versions stay
+    # empty (NaN for floats)
+    stats = np.zeros((), dtype=STATS_DTYPE)
+    stats['path_cost'] = stats['peak_tree_memory_mb'] = stats['closest_goal_distance'] = np.nan
+    names = values.dtype.names if isinstance(values, np.ndarray) else values.keys()
+    for name in STATS_DTYPE.names:
+        if name in names:
+            stats[name] = values[name]
+    return stats
+
+
+def _mmap_npz(filename: str) -> dict:
+    # np.load ignores mmap_mode for .npz archives, but members of an uncompressed archive are plain
+    # .npy files stored at a known offset, so they can be mapped directly.
+    arrays = {}
+    with zipfile.ZipFile(filename) as archive, open(filename, 'rb') as f:
+        for info in archive.infolist():
+            assert info.compress_type == zipfile.ZIP_STORED, "Compressed archives can't be memory-mapped"
+            # local file header: 30 fixed bytes, then the file name and the extra field
+            f.seek(info.header_offset + 26)
+            name_length, extra_length = struct.unpack('<HH', f.read(4))
+            f.seek(info.header_offset + 30 + name_length + extra_length)
+            version = np.lib.format.read_magic(f)
+            if version == (1, 0):
+                shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(f)
+            else:
+                shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(f)
+            name = info.filename[:-len('.npy')]
+            if dtype.hasobject or len(shape) == 0 or 0 in shape:
+                f.seek(info.header_offset + 30 + name_length + extra_length)
+                arrays[name] = np.lib.format.read_array(f)
+                continue
+            arrays[name] = np.memmap(filename, dtype=dtype, mode='r', offset=f.tell(), shape=shape,
+                                     order='F' if fortran_order else 'C')
+    return arrays
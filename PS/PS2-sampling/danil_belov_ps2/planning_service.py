@@ -0,0 +1,306 @@
+"""
+Long-running local planning service.
+
+Scenes (environments) are loaded once per worker process and kept warm, and the collision kernels are
+compiled when a worker starts, so a query only pays for planning. Requests are served concurrently by
+asyncio and planned in a process pool, including several requests in flight on one connection.
+
+Start the server:
+    python planning_service.py --socket /tmp/rrt.sock --scene default=data.pickle
+Query it:
+    client = PlanningClient("/tmp/rrt.sock")
+    path, stats = client.plan(start_angles, goal_angles)
+    results = client.plan_many([(start_angles, goal_angles), ...])
+
+Wire format (both directions): 4-byte big-endian header length, JSON header, raw payload.
+Responses carry the path as a float32 array of shape (n_states, n_joints) in the payload, and echo the
+"id" of their request, as responses on one connection are sent in completion order.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import pickle
+import socket
+import struct
+import numpy as np
+
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Tuple
+from angle_util import angle_difference
+from environment import State, ManipulatorEnv
+from rrt import RRTPlanner, weighted_l1_distance_batch
+
+HEADER_LENGTH = struct.Struct(">I")
+PATH_DTYPE = np.float32
+
+
+def l1_distance(state1, state2):
+    return np.sum(np.abs(angle_difference(state2.angles, state1.angles)))
+
+
+def load_scene(filename: str) -> ManipulatorEnv:
+    with open(filename, "rb") as handle:
+        data = pickle.load(handle)
+    return ManipulatorEnv(obstacles=np.array(data["obstacles"]),
+                          initial_state=State(np.array(data["start_state"])),
+                          collision_threshold=data["collision_threshold"])
+
+
+def _check_angles(name: str, angles, n_joints: int) -> Optional[str]:
+    """
+    :return: why the angles of a request are not a valid state of the scene, None if they are
+    """
+    try:
+        angles = np.asarray(angles, dtype=float)
+    except (TypeError, ValueError):
+        return f"{name} must be a list of angles"
+    if angles.shape != (n_joints,):
+        return f"{name} must have shape ({n_joints},), got {angles.shape}"
+    if not (np.abs(angles) <= 180.0).all():
+        return f"{name} angles must be in [-180, 180] degrees"
+    return None
+
+
+# Per worker process: scene name -> environment, built once by the pool initializer
+_scenes: Dict[str, ManipulatorEnv] = {}
+
+
+def _init_worker(scene_files: Dict[str, str]):
+    for name, filename in scene_files.items():
+        env = load_scene(filename)
+        # the first kernel calls load the backend and, with Numba, compile it
+        angles = env.state.angles[None].astype(float)
+        env.check_collision_batch(angles)
+        env.check_edges_batch(angles, angles, 1)
+        env.reset_collision_checks()
+        _scenes[name] = env
+
+
+def _plan_query(scene: str,
+                start: list,
+                goal: list,
+                max_iterations: Optional[int] = None,
+                goal_bias: float = 0.1,
+                max_angle_step: float = 10.0,
+                seed: Optional[int] = None,
+                time_budget_s: Optional[float] = None,
+                batch_size: int = 1) -> Tuple[np.ndarray, dict]:
+    env = _scenes[scene]
+    planner = RRTPlanner(env, distance_fn=l1_distance, max_angle_step=max_angle_step,
+                         batch_distance_fn=weighted_l1_distance_batch())
+    plan = planner.plan(State(np.array(start, dtype=float)), State(np.array(goal, dtype=float)),
+                        max_iterations=max_iterations, goal_bias=goal_bias, seed=seed,
+                        time_budget_s=time_budget_s, batch_size=batch_size)
+    path = np.array([state.angles for state in plan], dtype=PATH_DTYPE)
+    return path, planner.get_run_stats()
+
+
+class PlanningServer:
+
+    def __init__(self, scene_files: Dict[str, str], n_workers: Optional[int] = None):
+        """
+        :param scene_files: scene name -> pickle file in the data.pickle format
+        :param n_workers: number of planning processes (defaults to the number of cores)
+        """
+        self._scene_files = dict(scene_files)
+        self._n_joints = {}
+        for name, filename in self._scene_files.items():
+            with open(filename, "rb") as handle:
+                self._n_joints[name] = len(pickle.load(handle)["start_state"])
+        self._n_workers = n_workers or os.cpu_count() or 1
+        self._executor = None
+
+    async def serve(self, socket_path: Optional[str] = None, host: str = "127.0.0.1", port: int = 8765):
+        """
+        Serves requests on a Unix socket if socket_path is given, otherwise on host:port.
+        """
+        self._executor = ProcessPoolExecutor(max_workers=self._n_workers, initializer=_init_worker,
+                                             initargs=(self._scene_files,))
+        # Start all workers now, so that the first queries don't pay for loading the scenes
+        warmup = [self._executor.submit(os.getpid) for _ in range(self._n_workers)]
+        for future in warmup:
+            future.result()
+        try:
+            if socket_path is not None:
+                if os.path.exists(socket_path):
+                    os.remove(socket_path)
+                server = await asyncio.start_unix_server(self._handle_connection, path=socket_path)
+            else:
+                server = await asyncio.start_server(self._handle_connection, host=host, port=port)
+            print(f"Planning service ready ({self._n_workers} workers, scenes: {sorted(self._scene_files)})")
+            async with server:
+                await server.serve_forever()
+        finally:
+            self._executor.shutdown()
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        # every request is planned in its own task, so a slow query doesn't hold back the next ones
+        # on the same connection; responses are written whole, in completion order
+        write_lock = asyncio.Lock()
+        tasks = set()
+
+        async def respond(header: dict):
+            response_header, payload = await self._handle_request(header)
+            async with write_lock:
+                writer.write(_encode_message(response_header, payload))
+                await writer.drain()
+
+        try:
+            while True:
+                try:
+                    header, _ = await _read_message(reader)
+                except asyncio.IncompleteReadError:
+                    break
+                except (json.JSONDecodeError, UnicodeDecodeError, KeyError, TypeError, AttributeError) as e:
+                    # the payload size is unknown, so the rest of the stream can't be framed any more
+                    async with write_lock:
+                        writer.write(_encode_message({"status": "error",
+                                                      "message": f"Malformed request header: {e!r}"}))
+                        await writer.drain()
+                    break
+                task = asyncio.create_task(respond(header))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+            if tasks:
+                await asyncio.gather(*tasks, return_exceptions=True)
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def _handle_request(self, header: dict) -> Tuple[dict, bytes]:
+        response = {"id": header["id"]} if "id" in header else {}
+        scene = header.get("scene", "default")
+        if scene not in self._scene_files:
+            return dict(response, status="error", message=f"Unknown scene: {scene}"), b""
+        if "start" not in header or "goal" not in header:
+            return dict(response, status="error", message="Malformed request: start and goal are required"), b""
+        for name in ("start", "goal"):
+            message = _check_angles(name, header[name], self._n_joints[scene])
+            if message is not None:
+                return dict(response, status="error", message=f"Malformed request: {message}"), b""
+        loop = asyncio.get_running_loop()
+        try:
+            path, stats = await loop.run_in_executor(
+                self._executor, _plan_query, scene, header["start"], header["goal"],
+                header.get("max_iterations"), header.get("goal_bias", 0.1),
+                header.get("max_angle_step", 10.0), header.get("seed"), header.get("time_budget_s"),
+                header.get("batch_size", 1))
+        except Exception as e:
+            return dict(response, status="error", message=repr(e)), b""
+        return dict(response, status="ok", shape=list(path.shape), dtype=np.dtype(PATH_DTYPE).str,
+                    stats=stats), path.tobytes()
+
+
+class PlanningClient:
+
+    def __init__(self, socket_path: Optional[str] = None, host: str = "127.0.0.1", port: int = 8765):
+        """
+        Blocking client for PlanningServer. Keeps one connection open for all queries.
+        """
+        if socket_path is not None:
+            self._sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            self._sock.connect(socket_path)
+        else:
+            self._sock = socket.create_connection((host, port))
+
+    def plan(self,
+             start_angles: np.ndarray,
+             goal_angles: np.ndarray,
+             scene: str = "default",
+             **planner_kwargs) -> Tuple[np.ndarray, dict]:
+        """
+        :param planner_kwargs: max_iterations, goal_bias, max_angle_step, seed, time_budget_s (planning time
+            only, the time spent waiting for a free worker is not counted), batch_size
+        :return: path as an array of angles (shape: (n_states, 4)) and the run statistics
+        """
+        return self.plan_many([(start_angles, goal_angles)], scene, **planner_kwargs)[0]
+
+    def plan_many(self,
+                  queries: List[Tuple[np.ndarray, np.ndarray]],
+                  scene: str = "default",
+                  **planner_kwargs) -> List[Tuple[np.ndarray, dict]]:
+        """
+        Sends all queries at once, so the server plans them concurrently, and waits for all responses.
+
+        :param queries: (start_angles, goal_angles) pairs
+        :param planner_kwargs: see plan()
+        :return: (path, run statistics) of every query, in the order of the queries
+        :raises RuntimeError: if any query failed, after all responses have been read
+        """
+        for request_id, (start_angles, goal_angles) in enumerate(queries):
+            header = {"id": request_id,
+                      "scene": scene,
+                      "start": np.asarray(start_angles, dtype=float).tolist(),
+                      "goal": np.asarray(goal_angles, dtype=float).tolist()}
+            header.update(planner_kwargs)
+            self._sock.sendall(_encode_message(header))
+        results = [None] * len(queries)
+        errors = {}
+        # every response is read before raising, otherwise the rest would be left on the socket
+        # and returned to the next call
+        for _ in range(len(queries)):
+            response, payload = _recv_message(self._sock)
+            if response["status"] != "ok":
+                errors[response.get("id")] = response["message"]
+                continue
+            path = np.frombuffer(payload, dtype=np.dtype(response["dtype"])).reshape(response["shape"])
+            results[response["id"]] = (path, response["stats"])
+        if errors:
+            raise RuntimeError("; ".join(f"query {request_id}: {message}"
+                                         for request_id, message in sorted(errors.items(), key=str)))
+        return results
+
+    def close(self):
+        self._sock.close()
+
+
+def _encode_message(header: dict, payload: bytes = b"") -> bytes:
+    header = dict(header, payload_size=len(payload))
+    encoded = json.dumps(header).encode()
+    return HEADER_LENGTH.pack(len(encoded)) + encoded + payload
+
+
+async def _read_message(reader: asyncio.StreamReader) -> Tuple[dict, bytes]:
+    (length,) = HEADER_LENGTH.unpack(await reader.readexactly(HEADER_LENGTH.size))
+    header = json.loads(await reader.readexactly(length))
+    payload = await reader.readexactly(header.pop("payload_size"))
+    return header, payload
+
+
+def _recv_message(sock: socket.socket) -> Tuple[dict, bytes]:
+    (length,) = HEADER_LENGTH.unpack(_recv_exactly(sock, HEADER_LENGTH.size))
+    header = json.loads(_recv_exactly(sock, length))
+    payload = _recv_exactly(sock, header.pop("payload_size"))
+    return header, payload
+
+
+def _recv_exactly(sock: socket.socket, n: int) -> bytes:
+    chunks = []
+    while n > 0:
+        chunk = sock.recv(n)
+        if not chunk:
+            raise ConnectionError("Planning service closed the connection")
+        chunks.append(chunk)
+        n -= len(chunk)
+    return b"".join(chunks)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local RRT planning service")
+    parser.add_argument("--socket", default=None, help="Unix socket path (default: serve on localhost TCP)")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--scene", action="append", default=[],
+                        help="name=file.pickle, may be repeated (default: default=data.pickle)")
+    args = parser.parse_args()
+
+    scene_files = dict(scene.split("=", 1) for scene in args.scene) or {"default": "data.pickle"}
+    server = PlanningServer(scene_files, n_workers=args.workers)
+    asyncio.run(server.serve(socket_path=args.socket, port=args.port))
+
+
+if __name__ == '__main__':
+    main()
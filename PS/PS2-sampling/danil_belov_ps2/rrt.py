@@ -1,38 +1,98 @@
 from typing import List, Callable, Tuple, Optional
+import sys
+import time
 import numpy as np
-from angle_util import angle_linspace, angle_difference
+from angle_util import angle_difference
 from environment import State, ManipulatorEnv
+from samplers import UniformSampler
+
+
+def weighted_l1_distance_batch(weights: Optional[np.ndarray] = None) -> Callable:
+    """
+    Vectorized counterpart of the weighted L1 angle distance used with RRTPlanner.
+    :return: function dist_fn(angles1, angles2) -> distances with angles1 of shape (N, n_joints) and angles2
+        of shape (M, n_joints), returning shape (N, M)
+    """
+    def dist_fn(angles1, angles2):
+        diffs = np.abs(((angles2[None, :, :] - angles1[:, None, :] + 180) % 360) - 180)
+        if weights is not None:
+            diffs = diffs * weights
+        return np.sum(diffs, axis=2)
+
+    return dist_fn
 
 
 class RRTPlanner:
 
+    GOAL_THRESHOLD = 5.0  # nodes closer than this to a goal try to connect to it
+    GOAL_RETRY_INTERVAL = 8  # near-goal nodes that are not the closest so far try to connect once per this many
+    PRUNE_POLICIES = ("far_leaves", "dominated")
+    PRUNE_FRACTION = 0.1  # share of max_tree_nodes freed by one pruning pass, so pruning doesn't run every iteration
+    MAX_ITERATIONS = 10000  # default sample budget of plan()
+    # Batched growth extends a tree that is up to one batch out of date, so it needs more samples than serial
+    # growth for the same tree, but a sample costs a fraction of a serial iteration. Its default budget is this
+    # many times larger, which solves more queries than the serial default in less time.
+    BATCHED_ITERATIONS_SCALE = 4
+
     def __init__(self,
                  env: ManipulatorEnv,
                  distance_fn: Callable,
-                 max_angle_step: float = 10.0):
+                 max_angle_step: float = 10.0,
+                 sampler: Optional[UniformSampler] = None,
+                 batch_distance_fn: Optional[Callable] = None,
+                 max_tree_nodes: Optional[int] = None,
+                 prune_policy: str = "far_leaves",
+                 keep_tree: bool = True):
         """
         :param env: manipulator environment
         :param distance_fn: function distance_fn(state1, state2) -> float
         :param max_angle_step: max allowed step for each joint in degrees
+        :param sampler: sampling strategy for random configurations (see samplers.py),
+            uniform sampling if None
+        :param batch_distance_fn: vectorized version of distance_fn working on angle arrays
+            (see weighted_l1_distance_batch), required for batched growth
+        :param max_tree_nodes: memory cap of the tree. When the tree grows past it, nodes are pruned until
+            (1 - PRUNE_FRACTION) * max_tree_nodes are left. The cap is checked once per iteration (once per
+            batch in batched growth). No cap if None.
+        :param prune_policy: "far_leaves" drops the leaves farthest from the goal. "dominated" first drops
+            every branch that can't improve the best solution of an anytime plan() (cost-to-come plus
+            distance to the goal not below the best path cost), then far leaves if that is not enough.
+            The root and the best path are never pruned.
+        :param keep_tree: if False, the tree is released when plan() returns and get_tree() is empty
         """
+        assert prune_policy in self.PRUNE_POLICIES, f"Unknown prune policy: {prune_policy}"
+        assert max_tree_nodes is None or max_tree_nodes >= 10, "max_tree_nodes is too small to plan with"
         self._env = env
         self._distance_fn = distance_fn
+        self._batch_distance_fn = batch_distance_fn
         self._max_angle_step = max_angle_step
-
+        self._sampler = sampler if sampler is not None else UniformSampler()
+        self._max_tree_nodes = max_tree_nodes
+        self._prune_policy = prune_policy
+        self._keep_tree = keep_tree
 
         self._nodes = []
         self._parents = []
+        self._costs = []  # cost-to-come of every node, distance_fn summed along the tree
+        self._goal_states = []
+        self._goal_angles = None
+        self._best_goal_parent = -1
+        self._best_goal_idx = -1
+        self._best_cost = np.inf
+        self._goal_dists = []  # distance of every node to its closest goal
+        self._closest_node_idx = -1
+        self._closest_node_dist = np.inf
+        self._n_skipped_goal_candidates = 0
+        self._n_goal_attempts = 0
+        self._peak_tree_nodes = 0
+        self._n_pruned = 0
+        self._node_bytes = 0
         self._n_steps_collision_check = 50
+        self._seed = None
+        self._stats = {}
 
     def _check_collision_between_configs(self, state1, state2):
-        angle_sequence = angle_linspace(state1.angles, state2.angles, self._n_steps_collision_check)
-        state_sequence = [State(angles) for angles in angle_sequence]
-        
-        for state in state_sequence:
-            if self._env.check_collision(state):
-                return True
-        
-        return False
+        return bool(self._edges_in_collision(state1.angles[None], state2.angles[None])[0])
 
     def _nearest_node(self, target_state) -> int:
         if len(self._nodes) == 0:
@@ -51,29 +111,98 @@ class RRTPlanner:
         
         return State(new_angles)
 
-    def _is_goal_reached(self, state, goal_state, threshold = 5.0):
-        return self._distance_fn(state, goal_state) < threshold
+    def _closest_goal(self, state) -> Tuple[int, float]:
+        """
+        :return: index of the goal closest to the state in the goal set and the distance to it
+        """
+        if len(self._goal_states) == 1:
+            return 0, self._distance_fn(state, self._goal_states[0])
+        if self._batch_distance_fn is not None:
+            distances = self._batch_distance_fn(state.angles[None].astype(float), self._goal_angles)[0]
+        else:
+            distances = [self._distance_fn(state, goal) for goal in self._goal_states]
+        goal_idx = int(np.argmin(distances))
+        return goal_idx, distances[goal_idx]
 
     def plan(self,
              start_state,
              goal_state,
-             max_iterations = 10000,
-             goal_bias = 0.1) -> List[State]:
+             max_iterations: Optional[int] = None,
+             goal_bias = 0.1,
+             seed: Optional[int] = None,
+             batch_size: int = 1,
+             time_budget_s: Optional[float] = None,
+             deadline: Optional[float] = None,
+             anytime: bool = False) -> List[State]:
+        """
+        RRT algorithm implementation.
+
+        :param goal_state: goal State or a goal set (list of States, e.g. from ik.sample_goal_states). With a goal
+            set, goal-biased samples pick one of the goals at random and the path ends at whichever goal is
+            reached (the cheapest one in anytime mode). Samplers are reset with the first goal of the set.
+        :param max_iterations: number of samples to draw, MAX_ITERATIONS if None (times BATCHED_ITERATIONS_SCALE
+            for batched growth)
+        :param seed: if not None, seeds np.random before planning so the run can be reproduced
+        :param batch_size: if > 1, every iteration draws batch_size samples and extends the tree towards all
+            of them at once (see _plan_batched). Every sample counts as one iteration.
+        :param time_budget_s: wall-clock budget in seconds, planning stops once it is spent
+        :param deadline: absolute time.perf_counter() value at which planning stops. If both limits are given,
+            the earlier one is used. The clock is checked once per iteration (once per batch in batched growth).
+        :param anytime: keep growing the tree after the first solution until max_iterations or the deadline,
+            and return the cheapest path found
+        :return: best path found so far: the cheapest path to a goal if there is one, the path to the node
+            closest to the goals otherwise. get_run_stats()['status'] tells which: "solved", "partial"
+            (max_iterations reached without a solution) or "timeout" (the deadline passed without a solution).
         """
-        RRT algorithm implementation. """
+        if max_iterations is None:
+            max_iterations = self.MAX_ITERATIONS * (self.BATCHED_ITERATIONS_SCALE if batch_size > 1 else 1)
+        if seed is not None:
+            np.random.seed(seed)
+        self._seed = seed
+        start_time = time.perf_counter()
+        stop_time = np.inf if deadline is None else deadline
+        if time_budget_s is not None:
+            stop_time = min(stop_time, start_time + time_budget_s)
 
         self._nodes = [start_state]
         self._parents = [-1]
+        self._costs = [0.0]
+        self._goal_states = [goal_state] if isinstance(goal_state, State) else list(goal_state)
+        assert len(self._goal_states) > 0, "Empty goal set"
+        self._goal_angles = np.array([goal.angles for goal in self._goal_states], dtype=float)
+        self._best_goal_parent = -1
+        self._best_goal_idx = -1
+        self._best_cost = np.inf
+        self._goal_dists = [float(self._closest_goal(start_state)[1])]
+        self._closest_node_idx = 0
+        self._closest_node_dist = self._goal_dists[0]
+        self._n_skipped_goal_candidates = 0
+        self._n_goal_attempts = 0
+        self._peak_tree_nodes = 1
+        self._n_pruned = 0
+        self._node_bytes = _node_memory_bytes(start_state)
+        self._sampler.reset(start_state, self._goal_states[0])
+        if batch_size > 1:
+            return self._plan_batched(start_state, max_iterations, goal_bias, batch_size, start_time, stop_time,
+                                      anytime)
         
+        iterations = 0
         for iteration in range(max_iterations):
+            if time.perf_counter() >= stop_time:
+                break
+            if self._max_tree_nodes is not None and len(self._nodes) > self._max_tree_nodes:
+                self._prune()
+            iterations = iteration + 1
             if iteration % 1000 == 0:
                 print(f"RRT iteration: {iteration}/{max_iterations}, tree size: {len(self._nodes)}")
             
             if np.random.random() < goal_bias:
-                q_rand = goal_state
+                if len(self._goal_states) == 1:
+                    q_rand = self._goal_states[0]
+                else:
+                    q_rand = self._goal_states[np.random.randint(len(self._goal_states))]
             else:
-                random_angles = np.random.uniform(-180, 180, 4)
-                q_rand = State(random_angles)
+                q_rand = State(self._sampler.sample())
             
             nearest_idx = self._nearest_node(q_rand)
             q_near = self._nodes[nearest_idx]
@@ -83,21 +212,270 @@ class RRTPlanner:
             if not self._check_collision_between_configs(q_near, q_new):
                 self._nodes.append(q_new)
                 self._parents.append(nearest_idx)
+                self._costs.append(self._costs[nearest_idx] + self._distance_fn(q_near, q_new))
                 
-                if self._is_goal_reached(q_new, goal_state):
-                    if not self._check_collision_between_configs(q_new, goal_state):
-                        self._nodes.append(goal_state)
-                        self._parents.append(len(self._nodes) - 2)
-                        
-                        path = self._reconstruct_path(len(self._nodes) - 1)
-                        print(f"Goal reached at iteration {iteration}!")
-                        return path
+                goal_idx, goal_dist = self._closest_goal(q_new)
+                if self._track_goal_distances(np.array([goal_dist]))[0]:
+                    if self._connect_to_goal(len(self._nodes) - 1, goal_idx, iteration) and not anytime:
+                        break
         
-        print(f"Warning: Max iterations ({max_iterations}) reached. Returning path to closest node.")
-        closest_to_goal_idx = self._nearest_node(goal_state)
-        path = self._reconstruct_path(closest_to_goal_idx)
+        return self._finish(iterations, max_iterations, start_time)
+
+    def _plan_batched(self, start_state, max_iterations, goal_bias, batch_size, start_time, stop_time, anytime):
+        # Nearest neighbours, steering and edge checks are done for the whole batch with array operations,
+        # accepted nodes are appended in bulk. Random samples of one batch don't see each other's new nodes.
+        assert self._batch_distance_fn is not None, "Batched growth needs batch_distance_fn"
+        n_joints = start_state.angles.shape[0]
+        goal_angles = self._goal_angles
+        tree_angles = np.empty((max(1024, batch_size), n_joints))
+        tree_angles[0] = start_state.angles
+        n_tree = 1
+
+        iterations = 0
+        for iteration in range(0, max_iterations, batch_size):
+            if time.perf_counter() >= stop_time:
+                break
+            if self._max_tree_nodes is not None and n_tree > self._max_tree_nodes:
+                kept = self._prune()
+                tree_angles[:len(kept)] = tree_angles[kept]
+                n_tree = len(kept)
+            if iteration // 1000 != (iteration - batch_size) // 1000:
+                print(f"RRT iteration: {iteration}/{max_iterations}, tree size: {len(self._nodes)}")
+            k = min(batch_size, max_iterations - iteration)
+            iterations = iteration + k
+
+            q_rand = self._sampler.sample_batch(k)
+            goal_samples = np.random.random(k) < goal_bias
+            if len(goal_angles) == 1:
+                goal_choice = np.zeros(goal_samples.sum(), dtype=np.int64)
+            else:
+                goal_choice = np.random.randint(len(goal_angles), size=goal_samples.sum())
+            q_rand = q_rand[~goal_samples]
+            nearest_idx = np.argmin(self._batch_distance_fn(tree_angles[:n_tree], q_rand), axis=0)
+            q_near = tree_angles[nearest_idx]
+            steps = np.clip(_wrap(q_rand - q_near), -self._max_angle_step, self._max_angle_step)
+            q_new = _wrap(q_near + steps)
+            # samples beyond max_angle_step of the same node in the same direction give the same new node
+            unique = np.sort(np.unique(q_new, axis=0, return_index=True)[1])
+            nearest_idx, q_near, q_new = nearest_idx[unique], q_near[unique], q_new[unique]
+            # Goal-biased samples would all steer the same nearest node to the same new node, so the draws of
+            # one goal are chained instead: the j-th one extends the node added by the (j-1)-th, as consecutive
+            # goal draws do in serial growth.
+            chain_parents = []
+            for goal_idx, n_draws in zip(*np.unique(goal_choice, return_counts=True)):
+                goal = goal_angles[goal_idx]
+                chain_start = int(np.argmin(self._batch_distance_fn(tree_angles[:n_tree], goal[None])[:, 0]))
+                diff = _wrap(goal - tree_angles[chain_start])
+                n_steps = min(int(n_draws), max(1, int(np.ceil(np.abs(diff).max() / self._max_angle_step))))
+                reach = self._max_angle_step * np.arange(n_steps + 1)[:, None]
+                chain = _wrap(tree_angles[chain_start] + np.clip(diff, -reach, reach))
+                q_near = np.concatenate([q_near, chain[:-1]])
+                q_new = np.concatenate([q_new, chain[1:]])
+                chain_parents.append((len(nearest_idx), chain_start, n_steps))
+                nearest_idx = np.concatenate([nearest_idx, np.full(n_steps, -1)])
+
+            free = ~self._edges_in_collision(q_near, q_new)
+            for chain_offset, chain_start, n_steps in chain_parents:
+                # a chain node is only added if the whole chain up to it is collision free
+                free[chain_offset:chain_offset + n_steps] = \
+                    np.logical_and.accumulate(free[chain_offset:chain_offset + n_steps])
+            if not free.any():
+                continue
+            first_new = n_tree
+            # parents of chain nodes: the chain start, then the previous chain node among the new nodes
+            new_index = first_new + np.cumsum(free) - 1
+            for chain_offset, chain_start, n_steps in chain_parents:
+                nearest_idx[chain_offset] = chain_start
+                nearest_idx[chain_offset + 1:chain_offset + n_steps] = new_index[chain_offset:chain_offset + n_steps - 1]
+            q_new, parents = q_new[free], nearest_idx[free]
+            if n_tree + len(q_new) > len(tree_angles):
+                tree_angles = np.concatenate([tree_angles, np.empty_like(tree_angles)])
+            tree_angles[n_tree:n_tree + len(q_new)] = q_new
+            n_tree += len(q_new)
+            for angles, parent in zip(q_new, parents.tolist()):
+                state = State(angles)
+                self._nodes.append(state)
+                self._parents.append(parent)
+                self._costs.append(self._costs[parent] + self._distance_fn(self._nodes[parent], state))
+
+            goal_dists = self._batch_distance_fn(q_new, goal_angles)
+            closest_goal = np.argmin(goal_dists, axis=1)
+            goal_dist = goal_dists[np.arange(len(q_new)), closest_goal]
+            near_goal = np.flatnonzero(self._track_goal_distances(goal_dist))
+            goal_costs = np.array(self._costs[first_new:n_tree])[near_goal] + goal_dist[near_goal]
+            improving = goal_costs < self._best_cost
+            near_goal, goal_costs = near_goal[improving], goal_costs[improving]
+            if len(near_goal) == 0:
+                continue
+            self._n_goal_attempts += len(near_goal)
+            goal_free = ~self._edges_in_collision(q_new[near_goal], goal_angles[closest_goal[near_goal]])
+            if goal_free.any():
+                cheapest = near_goal[goal_free][np.argmin(goal_costs[goal_free])]
+                self._connect_to_goal(first_new + int(cheapest), int(closest_goal[cheapest]), iteration + k - 1,
+                                      edge_checked=True)
+                if not anytime:
+                    break
+
+        return self._finish(iterations, max_iterations, start_time)
+
+    def _track_goal_distances(self, goal_dists: np.ndarray) -> np.ndarray:
+        """
+        Records the goal distances of the nodes just appended to the tree, keeps track of the node closest to
+        the goals and schedules goal connection attempts: a node within GOAL_THRESHOLD tries to connect if it is
+        the closest node so far, other near-goal nodes only once per GOAL_RETRY_INTERVAL, so that a blocked goal
+        approach doesn't cost an edge check for every node growing around it.
+
+        :param goal_dists: distance of every new node to its closest goal, in insertion order
+        :return: True for the nodes that should try to connect to their goal
+        """
+        first_idx = len(self._goal_dists)
+        self._goal_dists.extend(goal_dists.tolist())
+        attempt = np.zeros(len(goal_dists), dtype=bool)
+        for i in np.flatnonzero(goal_dists < self.GOAL_THRESHOLD):
+            if goal_dists[i] < self._closest_node_dist or \
+                    self._n_skipped_goal_candidates >= self.GOAL_RETRY_INTERVAL:
+                attempt[i] = True
+                self._n_skipped_goal_candidates = 0
+            else:
+                self._n_skipped_goal_candidates += 1
+            if goal_dists[i] < self._closest_node_dist:
+                self._closest_node_idx, self._closest_node_dist = first_idx + int(i), float(goal_dists[i])
+        closest = int(np.argmin(goal_dists))
+        if goal_dists[closest] < self._closest_node_dist:
+            self._closest_node_idx, self._closest_node_dist = first_idx + closest, float(goal_dists[closest])
+        return attempt
+
+    def _connect_to_goal(self, node_idx, goal_idx, iteration, edge_checked=False) -> bool:
+        """
+        Tries to connect the tree node to a goal of the goal set and keeps the connection if it gives the
+        cheapest path so far.
+        :param edge_checked: the edge to the goal is already known to be collision free
+        :return: True if the connection was kept
+        """
+        node = self._nodes[node_idx]
+        goal_state = self._goal_states[goal_idx]
+        cost = self._costs[node_idx] + self._distance_fn(node, goal_state)
+        if cost >= self._best_cost:
+            return False
+        if not edge_checked:
+            self._n_goal_attempts += 1
+            if self._check_collision_between_configs(node, goal_state):
+                return False
+        if np.isfinite(self._best_cost):
+            print(f"Path improved at iteration {iteration}, cost: {cost:.1f}")
+        else:
+            print(f"Goal reached at iteration {iteration}!")
+        self._best_goal_parent = node_idx
+        self._best_goal_idx = goal_idx
+        self._best_cost = cost
+        self._sampler.notify_solution(cost)
+        return True
+
+    def _finish(self, iterations, max_iterations, start_time) -> List[State]:
+        # Returns the best path found so far and records the run statistics. The goal node is added to the
+        # tree only here, so in anytime mode it is attached to the best of the connections found.
+        if self._best_goal_parent >= 0:
+            self._nodes.append(self._goal_states[self._best_goal_idx])
+            self._parents.append(self._best_goal_parent)
+            self._costs.append(self._best_cost)
+            self._goal_dists.append(0.0)
+            path = self._reconstruct_path(len(self._nodes) - 1)
+            status = "solved"
+        else:
+            if iterations < max_iterations:
+                print(f"Warning: Time budget ran out after {iterations} iterations. Returning path to closest node.")
+                status = "timeout"
+            else:
+                print(f"Warning: Max iterations ({max_iterations}) reached. Returning path to closest node.")
+                status = "partial"
+            path = self._reconstruct_path(self._closest_node_idx)
+        self._update_stats(iterations, status, start_time)
+        if not self._keep_tree:
+            self.release_tree()
         return path
 
+    def _prune(self) -> np.ndarray:
+        """
+        Shrinks the tree to (1 - PRUNE_FRACTION) * max_tree_nodes nodes with the prune policy.
+        :return: indices of the kept nodes in the tree before pruning, ascending
+        """
+        n_nodes = len(self._nodes)
+        self._peak_tree_nodes = max(self._peak_tree_nodes, n_nodes)
+        target = int(self._max_tree_nodes * (1 - self.PRUNE_FRACTION))
+        parents = np.array(self._parents, dtype=np.int64)
+        goal_dist = np.array(self._goal_dists)
+
+        # the best path and the path to the node closest to the goals
+        protected = np.zeros(n_nodes, dtype=bool)
+        for node_idx in (self._best_goal_parent, self._closest_node_idx):
+            while node_idx != -1 and not protected[node_idx]:
+                protected[node_idx] = True
+                node_idx = parents[node_idx]
+
+        keep = np.ones(n_nodes, dtype=bool)
+        if self._prune_policy == "dominated" and np.isfinite(self._best_cost):
+            keep = (np.array(self._costs) + goal_dist < self._best_cost) | protected
+            # a dropped node takes its subtree with it (parents always come before their children)
+            while True:
+                propagated = keep & keep[np.maximum(parents, 0)]
+                if (propagated == keep).all():
+                    break
+                keep = propagated
+
+        n_kept = int(keep.sum())
+        while n_kept > target:
+            n_children = np.bincount(parents[keep & (parents >= 0)], minlength=n_nodes)
+            leaves = np.flatnonzero(keep & (n_children == 0) & ~protected)
+            if len(leaves) == 0:
+                break
+            drop = leaves[np.argsort(-goal_dist[leaves], kind="stable")[:n_kept - target]]
+            keep[drop] = False
+            n_kept -= len(drop)
+
+        kept = np.flatnonzero(keep)
+        new_index = np.cumsum(keep) - 1
+        kept_parents = parents[kept]
+        self._nodes = [self._nodes[i] for i in kept]
+        self._parents = np.where(kept_parents >= 0, new_index[kept_parents], -1).tolist()
+        self._costs = [self._costs[i] for i in kept]
+        self._goal_dists = goal_dist[kept].tolist()
+        self._closest_node_idx = int(new_index[self._closest_node_idx])
+        if self._best_goal_parent >= 0:
+            self._best_goal_parent = int(new_index[self._best_goal_parent])
+        self._n_pruned += n_nodes - len(kept)
+        return kept
+
+    def release_tree(self):
+        """
+        Frees the tree of the last plan() call. Run statistics are kept.
+        """
+        self._nodes = []
+        self._parents = []
+        self._costs = []
+        self._goal_dists = []
+
+    def _edges_in_collision(self, angles1: np.ndarray, angles2: np.ndarray) -> np.ndarray:
+        """
+        Vectorized _check_collision_between_configs for the edges angles1[i] -> angles2[i].
+        """
+        return self._env.check_edges_batch(angles1, angles2, self._n_steps_collision_check)
+
+    def _update_stats(self, iterations, status, start_time):
+        self._peak_tree_nodes = max(self._peak_tree_nodes, len(self._nodes))
+        self._stats = {
+            'iterations': iterations,
+            'goal_reached': status == "solved",
+            'status': status,
+            'path_cost': float(self._best_cost),
+            'tree_size': len(self._nodes),
+            'peak_tree_nodes': self._peak_tree_nodes,
+            'peak_tree_memory_mb': self._peak_tree_nodes * self._node_bytes / 2 ** 20,
+            'pruned_nodes': self._n_pruned,
+            'goal_connection_attempts': self._n_goal_attempts,
+            'closest_goal_distance': self._closest_node_dist,
+            'planning_time_s': time.perf_counter() - start_time,
+        }
+
     def _reconstruct_path(self, goal_idx):
         path = []
         current_idx = goal_idx
@@ -111,3 +489,33 @@ class RRTPlanner:
 
     def get_tree_size(self):
         return len(self._nodes)
+
+    def get_tree(self) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        :return: angles of all tree nodes (shape: (n_nodes, 4)) and index of each node's parent
+            (-1 for the root), in insertion order
+        """
+        if len(self._nodes) == 0:
+            return np.empty((0, ManipulatorEnv.N_LINKS)), np.empty(0, dtype=np.int64)
+        angles = np.array([node.angles for node in self._nodes]).reshape(len(self._nodes), -1)
+        return angles, np.array(self._parents, dtype=np.int64)
+
+    def get_seed(self) -> Optional[int]:
+        return self._seed
+
+    def get_run_stats(self) -> dict:
+        """
+        :return: statistics of the last plan() call
+        """
+        return dict(self._stats)
+
+
+def _node_memory_bytes(state: State) -> int:
+    # estimated memory of one tree node: the State with its arrays, its list slots and its parent and cost
+    attributes = vars(state)
+    state_bytes = sys.getsizeof(state) + sys.getsizeof(attributes) + sum(map(sys.getsizeof, attributes.values()))
+    return state_bytes + 3 * 8 + sys.getsizeof(1 << 20) + sys.getsizeof(1.0)
+
+
+def _wrap(angles: np.ndarray) -> np.ndarray:
+    return ((angles + 180) % 360) - 180
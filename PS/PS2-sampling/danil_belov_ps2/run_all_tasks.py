@@ -1,13 +1,18 @@
+import argparse
+import os
 import numpy as np
 import pickle
-import matplotlib.pyplot as plt
 from typing import List, Tuple
 import random
 
 from environment import State, ManipulatorEnv
 from rrt import RRTPlanner
+from plan_io import PlannerRun, save_run, load_run, run_key
+from main import RUN_SEED, RUN_PARAMS
 from angle_util import angle_linspace, angle_difference
-from video_util import animate_plan
+
+# matplotlib (figures) and video_util (cv2) are imported by the tasks that draw, so that the planning
+# tasks also run headless: python run_all_tasks.py --headless
 
 
 def l1_distance(state1, state2):
@@ -32,8 +37,32 @@ def check_collision_between_configs(env, state1, state2, n_steps = 50):
     return False, state_sequence
 
 
+def plan_or_load(run_file: str, env, start_state, goal_state, distance_fn, seed=None, key_params=None,
+                 **params) -> PlannerRun:
+    """
+    Loads run_file if it was saved for the same problem and parameters (see plan_io.run_key), plans and
+    saves it otherwise.
+
+    :param params: max_angle_step, max_iterations and goal_bias of the run
+    :param key_params: parameters that only go into the key, e.g. the weights of distance_fn
+    """
+    key = run_key(env, start_state, goal_state, seed, **params, **(key_params or {}))
+    if os.path.exists(run_file) and load_run(run_file).key == key:
+        print(f"Loading RRT run: {run_file}")
+        return load_run(run_file)
+    if os.path.exists(run_file):
+        print(f"Saved run {run_file} was planned for another problem or parameters, re-planning")
+    planner = RRTPlanner(env, distance_fn=distance_fn, max_angle_step=params['max_angle_step'])
+    plan = planner.plan(start_state, goal_state, max_iterations=params['max_iterations'],
+                        goal_bias=params['goal_bias'], seed=seed)
+    save_run(run_file, planner, plan, key=key)
+    print(f"Saved: {run_file}")
+    return load_run(run_file)
+
+
 def task_1a():
-    
+    import matplotlib.pyplot as plt
+
     with open("data.pickle", "rb") as handle:
         data = pickle.load(handle)
     
@@ -61,7 +90,8 @@ def task_1a():
     
 
 def task_1b():
-    
+    import matplotlib.pyplot as plt
+
     with open("data.pickle", "rb") as handle:
         data = pickle.load(handle)
     
@@ -101,7 +131,8 @@ def task_1b():
 
 
 def task_2a():
-    
+    import matplotlib.pyplot as plt
+
     with open("data.pickle", "rb") as handle:
         data = pickle.load(handle)
     
@@ -139,7 +170,7 @@ def task_2a():
     plt.close()
 
 
-def task_2b():
+def task_2b(run_file="rrt_run.npz", video=True):
 
     
     with open("data.pickle", "rb") as handle:
@@ -153,25 +184,24 @@ def task_2b():
     
 
     
-    planner = RRTPlanner(env, distance_fn=l1_distance, max_angle_step=10.0)
-    plan = planner.plan(start_state, goal_state, max_iterations=10000, goal_bias=0.1)
-    
+    # Reuse the run saved by main.py instead of re-planning just to make the video (same seed and parameters)
+    run = plan_or_load(run_file, env, start_state, goal_state, l1_distance, seed=RUN_SEED, **RUN_PARAMS)
+
+    if video:
+        from video_util import animate_plan
 
-    animate_plan(env, plan, video_output_file="solve_4R.mp4")
-    print("\nSaved: solve_4R.mp4")
+        animate_plan(env, run.plan_states(), video_output_file="solve_4R.mp4")
+        print("\nSaved: solve_4R.mp4")
     
-    return planner, plan
+    return run
 
 
-def task_2c(planner, plan):
+def task_2c(run):
     print("\n=== Task 2C: Statistics ===")
     
-    tree_size = planner.get_tree_size()
-    path_states = len(plan)
-    
-    path_length = 0.0
-    for i in range(len(plan) - 1):
-        path_length += l1_distance(plan[i], plan[i+1])
+    tree_size = int(run.stats['tree_size'])
+    path_states = len(run.plan_angles)
+    path_length = run.path_length()
     
     print(f"States visited (tree size): {tree_size} nodes")
     print(f"Final trajectory size: {path_states} states")
@@ -198,21 +228,19 @@ def task_2d():
     
     results = []
     
-    for weights, description in weight_configs:
+    for i, (weights, description) in enumerate(weight_configs):
         print(f"\nTesting: {description}")
         dist_fn = weighted_distance(weights)
-        planner = RRTPlanner(env, distance_fn=dist_fn, max_angle_step=10.0)
-        plan = planner.plan(start_state, goal_state, max_iterations=10000, goal_bias=0.1)
-        
-        tree_size = planner.get_tree_size()
-        path_length = sum(l1_distance(plan[i], plan[i+1]) for i in range(len(plan)-1))
+        run = plan_or_load(f"rrt_run_2d_{i}.npz", env, start_state, goal_state, dist_fn,
+                           key_params=dict(weights=weights.tolist()),
+                           max_angle_step=10.0, max_iterations=10000, goal_bias=0.1)
         
         results.append({
             'weights': weights,
             'description': description,
-            'tree_size': tree_size,
-            'path_length': path_length,
-            'path_states': len(plan)
+            'tree_size': int(run.stats['tree_size']),
+            'path_length': run.path_length(),
+            'path_states': len(run.plan_angles)
         })
         
 
@@ -234,28 +262,25 @@ def task_2e():
     
     for step_size in step_sizes:
         print(f"\nTesting step size: {step_size} degrees")
-        planner = RRTPlanner(env, distance_fn=l1_distance, max_angle_step=step_size)
-        plan = planner.plan(start_state, goal_state, max_iterations=10000, goal_bias=0.1)
-        
-        tree_size = planner.get_tree_size()
-        path_length = sum(l1_distance(plan[i], plan[i+1]) for i in range(len(plan)-1))
+        run = plan_or_load(f"rrt_run_2e_{step_size:g}.npz", env, start_state, goal_state, l1_distance,
+                           max_angle_step=step_size, max_iterations=10000, goal_bias=0.1)
         
         results.append({
             'step_size': step_size,
-            'tree_size': tree_size,
-            'path_length': path_length,
-            'path_states': len(plan)
+            'tree_size': int(run.stats['tree_size']),
+            'path_length': run.path_length(),
+            'path_states': len(run.plan_angles)
         })
         
 
 
-def main():    
-    task_1a()
-    task_1b()
-    
-    task_2a()
-    planner, plan = task_2b()
-    task_2c(planner, plan)
+def main(figures=True, video=True):
+    if figures:
+        task_1a()
+        task_1b()
+        task_2a()
+    run = task_2b(video=video)
+    task_2c(run)
     task_2d()
     task_2e()
     
@@ -263,5 +288,10 @@ def main():
 
 
 if __name__ == '__main__':
-    main()
+    parser = argparse.ArgumentParser(description="Run all PS2 tasks")
+    parser.add_argument("--no-video", action="store_true", help="skip the solve_4R.mp4 video")
+    parser.add_argument("--headless", action="store_true",
+                        help="planning tasks only: no figures and no video, matplotlib and cv2 are not loaded")
+    args = parser.parse_args()
+    main(figures=not args.headless, video=not (args.no_video or args.headless))
 
@@ -0,0 +1,265 @@
+from abc import ABC, abstractmethod
+from typing import List, Optional
+import numpy as np
+from angle_util import angle_difference
+from environment import State, ManipulatorEnv
+
+
+def wrap_angles(angles: np.ndarray) -> np.ndarray:
+    return ((angles + 180) % 360) - 180
+
+
+class UniformSampler:
+
+    def __init__(self, n_joints: int = ManipulatorEnv.N_LINKS):
+        """
+        Uniform sampling in [-180, 180]^n_joints, the default RRTPlanner behaviour.
+        """
+        self._n_joints = n_joints
+
+    def reset(self, start_state: State, goal_state: State) -> None:
+        """
+        Called by the planner at the beginning of every plan().
+        """
+        self._n_joints = start_state.angles.shape[0]
+
+    def notify_solution(self, cost: float) -> None:
+        """
+        Called by the planner when a path to the goal with the given cost has been found.
+        """
+        pass
+
+    def sample(self) -> np.ndarray:
+        """
+        :return: angles of the sampled configuration in degrees
+        """
+        return np.random.uniform(-180, 180, self._n_joints)
+
+    def sample_batch(self, n: int) -> np.ndarray:
+        """
+        :return: angles of n sampled configurations in degrees. Shape: (n, n_joints).
+        """
+        return np.random.uniform(-180, 180, (n, self._n_joints))
+
+
+class _BatchSampler(UniformSampler, ABC):
+    """
+    Generates candidates in batches, filters them with one batched collision check and hands them out
+    one at a time.
+    """
+
+    MAX_ROUNDS = 16  # batches generated per request before the missing samples are drawn uniformly
+
+    def __init__(self, env: ManipulatorEnv, batch_size: int = 256, n_joints: int = ManipulatorEnv.N_LINKS):
+        super().__init__(n_joints)
+        self._env = env
+        self._batch_size = batch_size
+        self._buffer = np.empty((0, n_joints))
+
+    def reset(self, start_state: State, goal_state: State) -> None:
+        super().reset(start_state, goal_state)
+        self._buffer = np.empty((0, self._n_joints))
+
+    def sample(self) -> np.ndarray:
+        return self.sample_batch(1)[0]
+
+    def sample_batch(self, n: int) -> np.ndarray:
+        # a scene where (almost) no candidate passes the filter, e.g. a bridge test without narrow passages,
+        # would otherwise never return
+        for _ in range(self.MAX_ROUNDS):
+            if len(self._buffer) >= n:
+                break
+            self._buffer = np.concatenate([self._buffer, self._sample_batch()])
+        if len(self._buffer) < n:
+            self._buffer = np.concatenate([self._buffer, super().sample_batch(n - len(self._buffer))])
+        samples, self._buffer = self._buffer[:n], self._buffer[n:]
+        return samples
+
+    @abstractmethod
+    def _sample_batch(self) -> np.ndarray:
+        """
+        :return: accepted samples, shape (n_accepted, n_joints). May be empty.
+        """
+
+
+class GaussianSampler(_BatchSampler):
+
+    def __init__(self, env: ManipulatorEnv, sigma: float = 10.0, batch_size: int = 256,
+                 n_joints: int = ManipulatorEnv.N_LINKS):
+        """
+        Gaussian sampling near obstacle boundaries: draws a uniform configuration and a Gaussian
+        neighbour of it, and keeps the free one of the pair only if the other one is in collision.
+
+        :param sigma: standard deviation of the neighbour offset in degrees
+        """
+        super().__init__(env, batch_size, n_joints)
+        self._sigma = sigma
+
+    def _sample_batch(self) -> np.ndarray:
+        q1 = np.random.uniform(-180, 180, (self._batch_size, self._n_joints))
+        q2 = wrap_angles(q1 + np.random.normal(0.0, self._sigma, q1.shape))
+        collision = self._env.check_collision_batch(np.concatenate([q1, q2]))
+        c1, c2 = collision[:self._batch_size], collision[self._batch_size:]
+        return np.concatenate([q1[~c1 & c2], q2[c1 & ~c2]])
+
+
+class BridgeSampler(_BatchSampler):
+
+    def __init__(self, env: ManipulatorEnv, sigma: float = 20.0, batch_size: int = 256,
+                 n_joints: int = ManipulatorEnv.N_LINKS):
+        """
+        Bridge test sampling for narrow passages: draws two nearby configurations and keeps their
+        midpoint if both ends are in collision and the midpoint is free.
+
+        :param sigma: standard deviation of the bridge length in degrees
+        """
+        super().__init__(env, batch_size, n_joints)
+        self._sigma = sigma
+
+    def _sample_batch(self) -> np.ndarray:
+        q1 = np.random.uniform(-180, 180, (self._batch_size, self._n_joints))
+        offset = np.random.normal(0.0, self._sigma, q1.shape)
+        q2 = wrap_angles(q1 + offset)
+        both_colliding = self._env.check_collision_batch(q1) & self._env.check_collision_batch(q2)
+        midpoints = wrap_angles(q1[both_colliding] + offset[both_colliding] / 2)
+        return midpoints[~self._env.check_collision_batch(midpoints)]
+
+
+class InformedSampler(_BatchSampler):
+
+    def __init__(self, env: ManipulatorEnv, base_sampler: Optional[UniformSampler] = None,
+                 batch_size: int = 256, n_joints: int = ManipulatorEnv.N_LINKS):
+        """
+        Goal-informed sampling: once a solution of cost c is known, samples only the prolate
+        hyperspheroids {q : |q - start| + |q - goal_k| <= c}, which contain every configuration that
+        can still improve the solution. Until then, delegates to base_sampler.
+
+        On the torus a path may wrap a joint either way, i.e. end at any image goal_k = goal + 360 k
+        of the goal, so there is one hyperspheroid per image that is at most c away from the start
+        (a single one while c is below the distance to the second closest image), and samples are
+        thinned where the hyperspheroids overlap on the torus, so they stay uniform. The
+        hyperspheroids use the L2 norm of the angle differences, which is never larger than the L1
+        path cost, so no improving configuration is excluded.
+        """
+        super().__init__(env, batch_size, n_joints)
+        self._base_sampler = base_sampler if base_sampler is not None else UniformSampler(n_joints)
+        self._best_cost = np.inf
+        self._start = None
+        self._goal_offset = None
+        self._ellipsoids = None
+
+    def reset(self, start_state: State, goal_state: State) -> None:
+        super().reset(start_state, goal_state)
+        self._base_sampler.reset(start_state, goal_state)
+        self._best_cost = np.inf
+        self._start = start_state.angles.astype(float)
+        # offset to the closest image of the goal, the short way around every joint
+        self._goal_offset = angle_difference(goal_state.angles.astype(float), self._start)
+        self._ellipsoids = None
+
+    def notify_solution(self, cost: float) -> None:
+        self._base_sampler.notify_solution(cost)
+        if cost < self._best_cost:
+            self._best_cost = cost
+            self._buffer = np.empty((0, self._n_joints))
+            self._ellipsoids = None
+
+    def sample(self) -> np.ndarray:
+        if not np.isfinite(self._best_cost):
+            return self._base_sampler.sample()
+        return super().sample()
+
+    def sample_batch(self, n: int) -> np.ndarray:
+        if not np.isfinite(self._best_cost):
+            return self._base_sampler.sample_batch(n)
+        return super().sample_batch(n)
+
+    @staticmethod
+    def _images(offsets: np.ndarray, radius: float):
+        """
+        :param offsets: angle offsets. Shape: (n, n_joints).
+        :return: (row of offsets, image) of every image offsets[row] + 360 k at most radius away from
+                 the origin. Shapes: (n_images,), (n_images, n_joints).
+        """
+        steps = 360.0 * np.arange(-np.ceil(radius / 360.0) - 1, np.ceil(radius / 360.0) + 2)
+        owners = np.arange(len(offsets))
+        images = np.zeros((len(offsets), 0))
+        squared_norms = np.zeros(len(offsets))
+        for joint in range(offsets.shape[1]):
+            wraps = offsets[owners, joint][:, None] + steps
+            rows, cols = np.nonzero(squared_norms[:, None] + wraps ** 2 <= radius ** 2)
+            owners = owners[rows]
+            images = np.concatenate([images[rows], wraps[rows, cols][:, None]], axis=1)
+            squared_norms = squared_norms[rows] + wraps[rows, cols] ** 2
+        return owners, images
+
+    def _ellipsoid(self, offset: np.ndarray, c_best: float) -> np.ndarray:
+        """
+        :return: linear map taking the unit ball to the hyperspheroid with foci 0 and offset
+        """
+        c_min = np.linalg.norm(offset)
+        # rotation taking the first axis to the start-goal direction
+        a1 = offset / c_min if c_min > 0 else np.eye(self._n_joints)[0]
+        u, _, vt = np.linalg.svd(np.outer(a1, np.eye(self._n_joints)[0]))
+        rotation = u @ np.diag([1.0] * (self._n_joints - 1) + [np.linalg.det(u) * np.linalg.det(vt)]) @ vt
+        radii = np.full(self._n_joints, np.sqrt(max(c_best ** 2 - c_min ** 2, 0.0)) / 2)
+        radii[0] = c_best / 2
+        return rotation * radii
+
+    def _sample_batch(self) -> np.ndarray:
+        c_best = max(self._best_cost, np.linalg.norm(self._goal_offset))
+        if self._ellipsoids is None:
+            _, offsets = self._images(self._goal_offset[None], c_best)
+            transforms = np.array([self._ellipsoid(offset, c_best) for offset in offsets])
+            volumes = np.abs(np.linalg.det(transforms))
+            weights = volumes / volumes.sum() if volumes.sum() > 0 else np.full(len(offsets), 1.0 / len(offsets))
+            self._ellipsoids = offsets, transforms, weights
+        offsets, transforms, weights = self._ellipsoids
+        # uniform samples in the unit ball, mapped into hyperspheroids picked in proportion to their volume
+        directions = np.random.normal(size=(self._batch_size, self._n_joints))
+        directions /= np.linalg.norm(directions, axis=1, keepdims=True)
+        ball = directions * np.random.uniform(size=(self._batch_size, 1)) ** (1.0 / self._n_joints)
+        picked = np.random.choice(len(offsets), size=self._batch_size, p=weights)
+        samples = np.einsum("bij,bj->bi", transforms[picked], ball) + offsets[picked] / 2
+        # a configuration whose images fall into m hyperspheroids in total is drawn m times as often,
+        # so it is kept with probability 1/m
+        owners, lifts = self._images(wrap_angles(samples), c_best)
+        costs = np.linalg.norm(lifts, axis=1)[:, None] + np.linalg.norm(lifts[:, None, :] - offsets[None], axis=2)
+        overlaps = np.bincount(owners, weights=np.sum(costs <= c_best * (1 + 1e-9), axis=1),
+                               minlength=self._batch_size)
+        samples = samples[np.random.uniform(size=self._batch_size) * np.maximum(overlaps, 1) < 1.0]
+        samples = wrap_angles(samples + self._start)
+        return samples[~self._env.check_collision_batch(samples)]
+
+
+class MixtureSampler(UniformSampler):
+
+    def __init__(self, samplers: List[UniformSampler], weights: List[float]):
+        """
+        Picks one of the samplers at random for every sample, e.g. to keep a share of uniform
+        samples next to a narrow-passage sampler.
+        """
+        super().__init__()
+        self._samplers = samplers
+        self._weights = np.asarray(weights, dtype=float) / np.sum(weights)
+
+    def reset(self, start_state: State, goal_state: State) -> None:
+        super().reset(start_state, goal_state)
+        for sampler in self._samplers:
+            sampler.reset(start_state, goal_state)
+
+    def notify_solution(self, cost: float) -> None:
+        for sampler in self._samplers:
+            sampler.notify_solution(cost)
+
+    def sample(self) -> np.ndarray:
+        return self._samplers[np.random.choice(len(self._samplers), p=self._weights)].sample()
+
+    def sample_batch(self, n: int) -> np.ndarray:
+        choices = np.random.choice(len(self._samplers), size=n, p=self._weights)
+        samples = np.empty((n, self._n_joints))
+        for i, sampler in enumerate(self._samplers):
+            mask = choices == i
+            if mask.any():
+                samples[mask] = sampler.sample_batch(int(mask.sum()))
+        return samples
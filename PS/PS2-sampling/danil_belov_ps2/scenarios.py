@@ -0,0 +1,139 @@
+import pickle
+import numpy as np
+
+from typing import Optional
+from environment import State
+
+
+def wrap_angles(angles: np.ndarray) -> np.ndarray:
+    return ((angles + 180) % 360) - 180
+
+
+def interpolate_configs(configs: np.ndarray, max_step: float = 2.0) -> np.ndarray:
+    """
+    Densely interpolates a sequence of configurations, taking the short way around every joint.
+    :param max_step: max change of any joint between consecutive configurations, in degrees
+    """
+    result = [configs[:1]]
+    for q1, q2 in zip(configs[:-1], configs[1:]):
+        diff = wrap_angles(q2 - q1)
+        n_steps = max(1, int(np.ceil(np.abs(diff).max() / max_step)))
+        t = np.linspace(0.0, 1.0, n_steps + 1)[1:, None]
+        result.append(wrap_angles(q1 + t * diff))
+    return np.concatenate(result)
+
+
+def closest_points_on_segments(points: np.ndarray, seg_start: np.ndarray, seg_end: np.ndarray,
+                               chunk_size: int = 2048):
+    """
+    :return: distance from every point to the closest of the segments (shape: (n_points,)) and that
+        closest point (shape: (n_points, 2))
+    """
+    d = seg_end - seg_start
+    length_sq = np.maximum(np.sum(d * d, axis=1), 1e-12)
+    distances = np.empty(len(points))
+    closest_points = np.empty((len(points), 2))
+    for i in range(0, len(points), chunk_size):
+        p = points[i:i + chunk_size, None, :]
+        t = np.clip(np.sum((p - seg_start) * d, axis=2) / length_sq, 0.0, 1.0)
+        closest = seg_start + t[..., None] * d
+        dist = np.linalg.norm(p - closest, axis=2)
+        nearest = np.argmin(dist, axis=1)
+        distances[i:i + chunk_size] = dist[np.arange(len(dist)), nearest]
+        closest_points[i:i + chunk_size] = closest[np.arange(len(dist)), nearest]
+    return distances, closest_points
+
+
+def generate_scenario(n_obstacles: int,
+                      n_links: int = 4,
+                      density: float = 0.3,
+                      passage_clearance: float = 0.2,
+                      narrow_fraction: float = 0.3,
+                      n_queries: int = 1,
+                      n_waypoints: int = 0,
+                      max_joint_delta: float = 120.0,
+                      collision_threshold: float = 0.1,
+                      seed: Optional[int] = None,
+                      max_candidates: int = 10000000) -> dict:
+    """
+    Generates a random obstacle field with guaranteed-solvable start/goal pairs.
+
+    For every query a witness path (start -> random waypoints -> goal) is drawn first, and obstacles
+    are only placed where they keep at least passage_clearance from every link along all witness paths.
+    The links sweep a large part of the workspace along a witness path, so keep the number of queries,
+    waypoints and max_joint_delta small when the density is high.
+    A narrow_fraction of the obstacles is placed exactly at that clearance, walling the witness paths in
+    and forming narrow passages.
+
+    :param n_obstacles: number of circular obstacles
+    :param n_links: number of unit links (DOF) of the manipulator
+    :param density: fraction of the reachable workspace disc covered by obstacles, sets their radius
+    :param passage_clearance: free margin around the witness paths (on top of collision_threshold)
+    :param narrow_fraction: fraction of obstacles placed right at the edge of the witness paths
+    :param n_queries: number of start/goal pairs
+    :param n_waypoints: random intermediate configurations of every witness path
+    :param max_joint_delta: max change of every joint between consecutive witness configurations, degrees
+    :return: dict in the data.pickle format (start_state, goal_state, obstacles, collision_threshold) for the
+        first query, plus "queries" with all (start, goal) pairs and "witness_paths"
+    """
+    rng = np.random.default_rng(seed)
+    workspace_radius = n_links + 0.5
+    radius = workspace_radius * np.sqrt(density / n_obstacles)
+    min_dist = radius + collision_threshold + passage_clearance
+
+    queries, witness_paths = [], []
+    for _ in range(n_queries):
+        steps = rng.uniform(-max_joint_delta, max_joint_delta, (n_waypoints + 1, n_links))
+        configs = wrap_angles(rng.uniform(-180, 180, n_links) + np.cumsum(np.concatenate(
+            [np.zeros((1, n_links)), steps]), axis=0))
+        queries.append((configs[0], configs[-1]))
+        witness_paths.append(interpolate_configs(configs))
+    joints = State.joint_positions_batch(np.concatenate(witness_paths))
+    seg_start = joints[:, :-1, :].reshape(-1, 2)
+    seg_end = joints[:, 1:, :].reshape(-1, 2)
+
+    n_narrow = int(round(narrow_fraction * n_obstacles))
+    centers = []
+    n_placed = 0
+    n_candidates = 0
+    while n_placed < n_obstacles:
+        if n_candidates > max_candidates:
+            raise RuntimeError(f"Could not place {n_obstacles} obstacles, placed {n_placed}. "
+                               f"Try a lower density or passage_clearance.")
+        batch_size = max(256, 2 * (n_obstacles - n_placed))
+        n_candidates += batch_size
+        r = workspace_radius * np.sqrt(rng.uniform(size=batch_size))
+        phi = rng.uniform(0, 2 * np.pi, batch_size)
+        candidates = np.stack([r * np.cos(phi), r * np.sin(phi)], axis=1)
+        distances, closest = closest_points_on_segments(candidates, seg_start, seg_end)
+        free = distances >= min_dist
+        candidates, distances, closest = candidates[free], distances[free], closest[free]
+        if n_placed < n_narrow:
+            # pull the obstacle towards the closest swept link point until it is exactly at the
+            # clearance, that point stays the closest one on the way
+            candidates = closest + (candidates - closest) * (min_dist / distances)[:, None] * (1.0 + 1e-9)
+            n_needed = n_narrow - n_placed
+        else:
+            n_needed = n_obstacles - n_placed
+        accepted = candidates[:n_needed]
+        centers.append(accepted)
+        n_placed += len(accepted)
+
+    centers = np.concatenate(centers)
+    obstacles = np.concatenate([centers, np.full((n_obstacles, 1), radius)], axis=1)
+    return {
+        "start_state": queries[0][0].tolist(),
+        "goal_state": queries[0][1].tolist(),
+        "obstacles": obstacles.tolist(),
+        "collision_threshold": collision_threshold,
+        "queries": [(start.tolist(), goal.tolist()) for start, goal in queries],
+        "witness_paths": witness_paths,
+    }
+
+
+def save_scenario(filename: str, scenario: dict) -> None:
+    """
+    Saves the scenario in the data.pickle format, so it can be loaded by main.py and friends.
+    """
+    with open(filename, "wb") as handle:
+        pickle.dump(scenario, handle)
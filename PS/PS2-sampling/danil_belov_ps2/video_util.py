@@ -1,20 +1,145 @@
+import os
 import numpy as np
 import matplotlib.pyplot as plt
 import cv2
 
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 from typing import List, Optional
 from matplotlib.backends.backend_agg import FigureCanvasAgg as FigureCanvas
 from environment import ManipulatorEnv, State
 
+VIDEO_FPS = 10
 
-def animate_plan(env: ManipulatorEnv, plan: List[State], video_output_file: Optional[str] = "solve_4R.mp4"):
+
+def animate_plan(env: ManipulatorEnv,
+                 plan: List[State],
+                 video_output_file: Optional[str] = "solve_4R.mp4",
+                 mode: str = "retained"):
     """
     Visualizes the plan with pyplot and, optionally, saves it to the video file.
 
     :param env: Manipulator environment
     :param plan: Plan - sequence of states
     :param video_output_file: If not None, saves animation to this file. Suggested extension is .mp4.
+    :param mode: "retained" draws the obstacles once and only moves the manipulator artists (blitting),
+        "redraw" clears and re-renders the whole figure for every frame
+    """
+    if len(plan) == 0:
+        return
+    if mode == "redraw":
+        _animate_plan_redraw(env, plan, video_output_file)
+        return
+    assert mode == "retained", f"Unknown animation mode: {mode}"
+
+    scene = _RetainedScene(env, len(plan[0].angles))
+    video_writer = None
+    for state in plan:
+        mat = scene.render_frame(state)
+        if video_output_file is None:
+            continue
+        if video_writer is None:
+            video_writer = cv2.VideoWriter(video_output_file, cv2.VideoWriter_fourcc(*'mp4v'), VIDEO_FPS,
+                                           (mat.shape[1], mat.shape[0]))
+        video_writer.write(mat)
+    if video_writer is not None:
+        video_writer.release()
+    scene.close()
+
+
+def animate_plan_parallel(env: ManipulatorEnv,
+                          plan: List[State],
+                          video_output_file: str = "solve_4R.mp4",
+                          n_workers: Optional[int] = None,
+                          chunk_size: int = 32,
+                          max_pending_chunks: Optional[int] = None):
+    """
+    Renders the plan in a process pool and writes it to the video file.
+
+    Each worker keeps its own retained scene and renders whole chunks of frames. Chunks are written
+    in plan order, and at most max_pending_chunks of them are in flight, so memory stays bounded
+    no matter how long the plan is.
+
+    :param env: Manipulator environment
+    :param plan: Plan - sequence of states
+    :param video_output_file: output video file. Suggested extension is .mp4.
+    :param n_workers: number of worker processes (defaults to the number of cores)
+    :param chunk_size: number of frames rendered by a worker per task
+    :param max_pending_chunks: bound of the chunk queue (defaults to 2 * n_workers)
+    """
+    angles = np.array([state.angles for state in plan])
+    chunks = [angles[i:i + chunk_size] for i in range(0, len(angles), chunk_size)]
+    if n_workers is None:
+        n_workers = os.cpu_count() or 1
+    if max_pending_chunks is None:
+        max_pending_chunks = 2 * n_workers
+    with ProcessPoolExecutor(max_workers=n_workers, initializer=_init_render_worker,
+                             initargs=(env, angles.shape[1])) as executor:
+        pending = deque()
+        video_writer = None
+        next_chunk = 0
+        while next_chunk < len(chunks) or pending:
+            while next_chunk < len(chunks) and len(pending) < max_pending_chunks:
+                pending.append(executor.submit(_render_chunk, chunks[next_chunk]))
+                next_chunk += 1
+            frames = pending.popleft().result()
+            if video_writer is None:
+                video_writer = cv2.VideoWriter(video_output_file, cv2.VideoWriter_fourcc(*'mp4v'), VIDEO_FPS,
+                                               (frames.shape[2], frames.shape[1]))
+            for mat in frames:
+                video_writer.write(mat)
+        if video_writer is not None:
+            video_writer.release()
+
+
+class _RetainedScene:
     """
+    Figure with static obstacles cached as a background and animated manipulator artists on top.
+    """
+
+    def __init__(self, env: ManipulatorEnv, n_links: int):
+        self._fig = plt.figure()
+        self._canvas = FigureCanvas(self._fig)
+        self._ax = self._fig.gca()
+        self._artists = env.create_artists(self._ax, n_links)
+        # the manipulator has unit links, so this keeps the whole arm in view
+        scene_lim = [-n_links - 0.5, n_links + 0.5]
+        self._ax.set_aspect('equal', adjustable='box')
+        self._ax.set_xlim(scene_lim)
+        self._ax.set_ylim(scene_lim)
+        self._canvas.draw()
+        self._background = self._canvas.copy_from_bbox(self._fig.bbox)
+
+    def render_frame(self, state: State) -> np.ndarray:
+        """
+        :return: BGR image of the frame, ready for cv2.VideoWriter
+        """
+        ManipulatorEnv.update_artists(self._artists, state)
+        self._canvas.restore_region(self._background)
+        for segment_line, markers_line in self._artists:
+            self._ax.draw_artist(segment_line)
+            self._ax.draw_artist(markers_line)
+        mat = np.asarray(self._canvas.buffer_rgba())
+        return cv2.cvtColor(mat, cv2.COLOR_RGBA2BGR)
+
+    def close(self):
+        plt.close(self._fig)
+
+
+_worker_scene = None
+
+
+def _init_render_worker(env: ManipulatorEnv, n_links: int):
+    global _worker_scene
+    plt.switch_backend("Agg")
+    _worker_scene = _RetainedScene(env, n_links)
+
+
+def _render_chunk(angles_chunk: np.ndarray) -> np.ndarray:
+    return np.stack([_worker_scene.render_frame(State(angles)) for angles in angles_chunk])
+
+
+def _animate_plan_redraw(env: ManipulatorEnv, plan: List[State], video_output_file: Optional[str]):
     video_writer = None
     fig = plt.figure()
     ax = plt.gca()
@@ -31,7 +156,7 @@ def animate_plan(env: ManipulatorEnv, plan: List[State], video_output_file: Opti
         if video_writer is not None:
             video_writer.write(mat)
         elif video_output_file is not None:
-            video_writer = cv2.VideoWriter(video_output_file, cv2.VideoWriter_fourcc(*'mp4v'), 10,
+            video_writer = cv2.VideoWriter(video_output_file, cv2.VideoWriter_fourcc(*'mp4v'), VIDEO_FPS,
                                            (mat.shape[1], mat.shape[0]))
             video_writer.write(mat)
 
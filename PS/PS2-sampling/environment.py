@@ -1,16 +1,16 @@
 import numpy as np
-import matplotlib.pyplot as plt
+from kernels import get_kernels
 
 
 class State:
 
     def __init__(self, angles: np.ndarray):
         """
-        Represents the state of the 4-link manipulator.
+        Represents the state of the n-link manipulator.
 
-        :param angles: 4 angles for each link of the manipulator in degrees. Shape: (4,).
+        :param angles: angles for each link of the manipulator in degrees, one per link. Shape: (n_links,).
         """
-        assert angles.shape == (4,)
+        assert angles.ndim == 1
         assert (np.abs(angles) >= 0.0).all() and (np.abs(angles) <= 180.0).all()
         self._angles = angles.copy()
         self._joints = State._calculate_joint_positions(angles)
@@ -18,38 +18,42 @@ class State:
     @property
     def angles(self) -> np.ndarray:
         """
-        :return: 4 angles for each link of the manipulator in degrees
+        :return: angles for each link of the manipulator in degrees. Shape: (n_links,).
         """
         return self._angles
 
     @property
     def joints(self) -> np.ndarray:
         """
-        :return: Positions of the 5 joints of the manipulator. Shape: (5, 2).
+        :return: Positions of the joints of the manipulator. Shape: (n_links + 1, 2), (5, 2) for 4 links.
         """
         return self._joints
 
     @staticmethod
     def _calculate_joint_positions(angles: np.ndarray) -> np.ndarray:
-        seg = np.zeros((5, 2))
-        a1, a2, a3, a4 = np.deg2rad(angles)
-        T1 = State._se2(np.array([0, 0, a1]))  # this is the first joint, a simple rotation
-        T2 = State._se2(
-            np.array([1, 0, a2]))  # the second joint, it is a bar of d =1, plus a rotation for the second joint
-        T3 = State._se2(np.array([1, 0, a3]))
-        T4 = State._se2(np.array([1, 0, a4]))
-        T5 = State._se2(
-            np.array([1, 0, 0]))  # this is simply to express the lenght of the second bar, no rotation required
-        p = T1 @ T2 @ np.array([0, 0, 1])
-        seg[1, :] = p[:2]
-        p = T1 @ T2 @ T3 @ np.array([0, 0, 1])
-        seg[2, :] = p[:2]
-        p = T1 @ T2 @ T3 @ T4 @ np.array([0, 0, 1])
-        seg[3, :] = p[:2]
-        p = T1 @ T2 @ T3 @ T4 @ T5 @ np.array([0, 0, 1])
-        seg[4, :] = p[:2]
+        n_links = angles.shape[0]
+        seg = np.zeros((n_links + 1, 2))
+        rad = np.deg2rad(angles)
+        T = State._se2(np.array([0, 0, rad[0]]))  # this is the first joint, a simple rotation
+        for k in range(1, n_links + 1):
+            # every next joint is a bar of d = 1 plus a rotation; after the last joint only the bar
+            # remains, to express the length of the last link
+            t = rad[k] if k < n_links else 0
+            T = T @ State._se2(np.array([1, 0, t]))
+            p = T @ np.array([0, 0, 1])
+            seg[k, :] = p[:2]
         return seg
 
+    @staticmethod
+    def joint_positions_batch(angles: np.ndarray) -> np.ndarray:
+        """
+        Vectorized forward kinematics, same chain as _calculate_joint_positions (unit links).
+
+        :param angles: batch of configurations in degrees. Shape: (N, n_links).
+        :return: joint positions of every configuration. Shape: (N, n_links + 1, 2).
+        """
+        return get_kernels("numpy").forward_kinematics(angles)
+
     @staticmethod
     def _se2(q):
         x, y, t = q
@@ -64,20 +68,56 @@ class ManipulatorEnv:
 
     OBSTACLES_DIM = 3  # x, y, radius (assume all obstacles are circles)
     N_LINKS = 4
+    LINK_COLORS = (np.array([1, 0, 0]), np.array([0, 1, 0]), np.array([0, 0, 1]), np.array([1, 0, 1]))
 
     def __init__(self,
                  obstacles: np.ndarray,
                  initial_state: State,
-                 collision_threshold: float = 0.1):
+                 collision_threshold: float = 0.1,
+                 self_collision: bool = False,
+                 backend: str = None):
+        """
+        :param obstacles: circular obstacles as rows of (x, y, radius)
+        :param initial_state: initial configuration
+        :param collision_threshold: min allowed distance between a link and an obstacle
+        :param self_collision: if True, non-adjacent links closer than collision_threshold to each other
+            are a collision too
+        :param backend: kernels for the batched checks, "numpy", "numba" or "auto" (see kernels.py).
+            If None, taken from the PLANNING_KERNELS environment variable.
+        """
         assert len(obstacles.shape) == 2 and obstacles.shape[1] == ManipulatorEnv.OBSTACLES_DIM
         self._obstacles = obstacles.copy()
         self._state = initial_state
         self._collision_threshold = collision_threshold
+        self._self_collision = self_collision
+        self._kernels = get_kernels(backend)
+        self._n_collision_checks = 0
 
     @property
     def state(self) -> State:
         return self._state
 
+    @property
+    def obstacles(self) -> np.ndarray:
+        """
+        :return: Obstacles as rows of (x, y, radius). Shape: (n_obstacles, 3).
+        """
+        return self._obstacles
+
+    @property
+    def collision_threshold(self) -> float:
+        return self._collision_threshold
+
+    @property
+    def n_collision_checks(self) -> int:
+        """
+        :return: number of configurations checked for collisions since creation or the last reset
+        """
+        return self._n_collision_checks
+
+    def reset_collision_checks(self) -> None:
+        self._n_collision_checks = 0
+
     @state.setter
     def state(self, new_state: State) -> None:
         self._state = new_state
@@ -87,42 +127,83 @@ class ManipulatorEnv:
         Checks state (configuration) for the collisions.
         :return True if collision, False if no collisions
         """
-        for obs in self._obstacles:
-            for i in range(ManipulatorEnv.N_LINKS):
-                segment = state_to_check.joints[[i, i+1], :]
-                r = obs[2] + self._collision_threshold
-                p0 = obs[:2]
-                p1 = segment[0]
-                p2 = segment[1]
-
-                # Check if p1 or p2 in circle
-                if np.linalg.norm(p0 - p1) <= r or np.linalg.norm(p0 - p2) <= r:
-                    return True
-
-                # Find projection
-                t = np.sum((p0 - p1) * (p2 - p1)) / (np.linalg.norm(p2 - p1) ** 2)
-                # Check if the projection is on the line
-                # (in other words, if line is fully in the circle)
-                if t < 0.0 or t > 1.0:
-                    continue
-                p4 = p1 + t * (p2 - p1)
-
-                if np.linalg.norm(p0 - p4) <= r:
-                    return True
-
+        self._n_collision_checks += 1
+        joints = state_to_check.joints[None]
+        if self._kernels.configs_in_collision(joints, self._obstacles, self._collision_threshold)[0]:
+            return True
+        if self._self_collision:
+            return bool(self._check_self_collision_batch(joints)[0])
         return False
 
+    def check_collision_batch(self, angles: np.ndarray) -> np.ndarray:
+        """
+        Vectorized version of check_collision for many configurations at once.
+        :param angles: configurations in degrees. Shape: (N, n_links).
+        :return: boolean array, True where the configuration is in collision. Shape: (N,).
+        """
+        angles = np.atleast_2d(np.asarray(angles, dtype=float))
+        self._n_collision_checks += angles.shape[0]
+        joints = self._kernels.forward_kinematics(angles)
+        collision = self._kernels.configs_in_collision(joints, self._obstacles, self._collision_threshold)
+        if self._self_collision:
+            # same forward kinematics pass, only configurations still free need the self check
+            free = ~collision
+            collision[free] = self._check_self_collision_batch(joints[free])
+        return collision
+
+    def check_edges_batch(self, angles1: np.ndarray, angles2: np.ndarray, n_steps: int = 50) -> np.ndarray:
+        """
+        Checks the shortest-angle edges angles1[i] -> angles2[i], interpolated in n_steps steps like
+        angle_linspace, for collisions.
+        :param angles1: edge starts in degrees. Shape: (n_edges, n_links).
+        :param angles2: edge ends in degrees. Shape: (n_edges, n_links).
+        :return: boolean array, True where the edge is in collision. Shape: (n_edges,).
+        """
+        angles1 = np.atleast_2d(np.asarray(angles1, dtype=float))
+        angles2 = np.atleast_2d(np.asarray(angles2, dtype=float))
+        if not self._self_collision:
+            self._n_collision_checks += angles1.shape[0] * (n_steps + 1)
+            return self._kernels.edges_in_collision(angles1, angles2, n_steps,
+                                                    self._obstacles, self._collision_threshold)
+        t = np.linspace(0.0, 1.0, n_steps + 1)[None, :, None]
+        diffs = ((angles2 - angles1 + 180) % 360) - 180
+        configs = ((angles1[:, None, :] + t * diffs[:, None, :] + 180) % 360) - 180
+        collision = self.check_collision_batch(configs.reshape(-1, angles1.shape[1]))
+        return collision.reshape(angles1.shape[0], n_steps + 1).any(axis=1)
+
+    def _check_self_collision_batch(self, joints: np.ndarray) -> np.ndarray:
+        """
+        Segment-segment tests of all non-adjacent link pairs.
+        :param joints: joint positions. Shape: (N, n_links + 1, 2).
+        :return: boolean array, True where two links intersect or are closer than collision_threshold
+        """
+        n_links = joints.shape[1] - 1
+        pairs = np.array([(i, j) for i in range(n_links) for j in range(i + 2, n_links)], dtype=int)
+        if len(pairs) == 0 or len(joints) == 0:
+            return np.zeros(len(joints), dtype=bool)
+        a0, a1 = joints[:, pairs[:, 0]], joints[:, pairs[:, 0] + 1]  # (N, pairs, 2)
+        b0, b1 = joints[:, pairs[:, 1]], joints[:, pairs[:, 1] + 1]
+        # proper intersection: the ends of each segment lie on different sides of the other one
+        d1, d2 = _cross(b0, b1, a0), _cross(b0, b1, a1)
+        d3, d4 = _cross(a0, a1, b0), _cross(a0, a1, b1)
+        intersect = (d1 * d2 < 0) & (d3 * d4 < 0)
+        # otherwise the closest points include an end of one of the segments
+        dist = np.minimum(np.minimum(_point_segment_distance(a0, b0, b1), _point_segment_distance(a1, b0, b1)),
+                          np.minimum(_point_segment_distance(b0, a0, a1), _point_segment_distance(b1, a0, a1)))
+        return (intersect | (dist <= self._collision_threshold)).any(axis=1)
+
     def render(self, plt_show=True) -> None:
         """
         Displays current configuration.
         :param plt_show: whether to call plt.show() or not
         """
-        self._plot_segment(self._state.joints[[0, 1], :], np.array([1, 0, 0]),
-                           is_start_link=True)
-        self._plot_segment(self._state.joints[[1, 2], :], np.array([0, 1, 0]))
-        self._plot_segment(self._state.joints[[2, 3], :], np.array([0, 0, 1]))
-        self._plot_segment(self._state.joints[[3, 4], :], np.array([1, 0, 1]),
-                           is_end_link=True)
+        import matplotlib.pyplot as plt  # drawing only, planning doesn't need matplotlib
+
+        colors = ManipulatorEnv.LINK_COLORS
+        n_links = self._state.joints.shape[0] - 1
+        for i in range(n_links):
+            self._plot_segment(self._state.joints[[i, i + 1], :], colors[i % len(colors)],
+                               is_start_link=(i == 0), is_end_link=(i == n_links - 1))
         for obs in self._obstacles:
             plt.gca().add_patch(
                 plt.Circle((obs[0], obs[1]), obs[2], fill=True))
@@ -130,8 +211,54 @@ class ManipulatorEnv:
         if plt_show:
             plt.show()
 
+    def create_artists(self, ax, n_links: int = N_LINKS) -> list:
+        """
+        Draws the obstacles once and creates the manipulator line artists, which can later be
+        moved with update_artists() instead of redrawing the whole scene.
+        :param ax: matplotlib axes to draw into
+        :param n_links: number of links of the manipulator
+        :return: list of (segment_line, markers_line) pairs, one per link
+        """
+        from matplotlib.patches import Circle
+
+        for obs in self._obstacles:
+            ax.add_patch(Circle((obs[0], obs[1]), obs[2], fill=True))
+        colors = ManipulatorEnv.LINK_COLORS
+        artists = []
+        for i in range(n_links):
+            color_ = colors[i % len(colors)]
+            segment_line, = ax.plot([], [], linewidth=2, color=color_, animated=True)
+            markers_line, = ax.plot([], [], linestyle='', marker='o', color=color_, animated=True)
+            artists.append((segment_line, markers_line))
+        # the first joint and the end effector have their own markers (see _plot_segment)
+        start_marker, = ax.plot([], [], linestyle='', marker='X',
+                                color=ManipulatorEnv.LINK_COLORS[0], animated=True)
+        end_marker, = ax.plot([], [], linestyle='', marker='>',
+                              color=colors[(n_links - 1) % len(colors)], animated=True)
+        artists.append((start_marker, end_marker))
+        return artists
+
+    @staticmethod
+    def update_artists(artists: list, state: State) -> None:
+        """
+        Moves artists created by create_artists() to the given state.
+        """
+        joints = state.joints
+        n_links = len(artists) - 1
+        for i, (segment_line, markers_line) in enumerate(artists[:n_links]):
+            s = joints[[i, i + 1], :]
+            segment_line.set_data(s[:, 0], s[:, 1])
+            # inner joints only, the outer ones are drawn by the start/end markers
+            inner = [j for j in (i, i + 1) if 0 < j < n_links]
+            markers_line.set_data(joints[inner, 0], joints[inner, 1])
+        start_marker, end_marker = artists[n_links]
+        start_marker.set_data(joints[:1, 0], joints[:1, 1])
+        end_marker.set_data(joints[-1:, 0], joints[-1:, 1])
+
     @staticmethod
     def _plot_segment(s, color_, is_start_link=False, is_end_link=False):
+        import matplotlib.pyplot as plt
+
         plt.plot(s[:, 0], s[:, 1], linewidth=2, color=color_)
         if is_end_link:
             plt.plot(s[1, 0], s[1, 1], marker='>', color=color_)
@@ -141,3 +268,13 @@ class ManipulatorEnv:
             plt.plot(s[0, 0], s[0, 1], marker='X', color=color_)
         else:
             plt.plot(s[0, 0], s[0, 1], marker='o', color=color_)
+
+
+def _cross(o: np.ndarray, a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    return (a[..., 0] - o[..., 0]) * (b[..., 1] - o[..., 1]) - (a[..., 1] - o[..., 1]) * (b[..., 0] - o[..., 0])
+
+
+def _point_segment_distance(p: np.ndarray, s0: np.ndarray, s1: np.ndarray) -> np.ndarray:
+    d = s1 - s0
+    t = np.clip(np.sum((p - s0) * d, axis=-1) / np.sum(d * d, axis=-1), 0.0, 1.0)
+    return np.linalg.norm(p - (s0 + t[..., None] * d), axis=-1)
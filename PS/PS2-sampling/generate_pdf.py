@@ -1,17 +1,31 @@
 """
 Generate camera-ready PDF write-up for PS2 assignment.
 Replace 'yourname' with your actual uniquename before running.
+
+Pages are rendered one by one into a cache (.pdf_cache/<content hash>.pdf next to this script) by a process
+pool and merged with pypdf, so a rebuild only renders the pages whose text, image or layout code changed.
+Without pypdf (or with --no-cache) the whole PDF is rendered serially.
 """
 
-from matplotlib.backends.backend_pdf import PdfPages
-import matplotlib.pyplot as plt
-from matplotlib import image as mpimg
+import argparse
+import hashlib
+import inspect
+import json
 import os
+from concurrent.futures import ProcessPoolExecutor
 
+# matplotlib is imported inside the functions, so that importing this module stays cheap
 
-def add_text_page(pdf, title, content, image_path=None):
-    """Add a page with proper margins (1 inch on all sides)."""
-    fig = plt.figure(figsize=(8.5, 11))
+# next to this script, so runs from different working directories share one cache
+CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".pdf_cache")
+
+
+def _text_figure(title, content, image_path=None):
+    """Page with proper margins (1 inch on all sides)."""
+    from matplotlib.figure import Figure
+    from matplotlib import image as mpimg
+
+    fig = Figure(figsize=(8.5, 11))
     
     # Set margins: 1 inch on all sides
     # In normalized coordinates: 1 inch / 8.5 inch = 0.118, 1 inch / 11 inch = 0.091
@@ -52,32 +66,48 @@ def add_text_page(pdf, title, content, image_path=None):
     ax_text.text(0, 1, content, fontsize=11, verticalalignment='top',
                 transform=ax_text.transAxes, wrap=True)
     
-    pdf.savefig(fig, bbox_inches='tight', dpi=300)
-    plt.close()
+    return fig
 
 
-def generate_pdf(uniquename="yourname"):
-    """Generate camera-ready PDF write-up for PS2."""
-    pdf_filename = f"{uniquename}_ps2.pdf"
-    
-    with PdfPages(pdf_filename) as pdf:
-        # Title page with proper margins
-        fig = plt.figure(figsize=(8.5, 11))
-        # Title respects side margins (centered but within margins)
-        fig.text(0.5, 0.6, "PS2: Path Planning with RRT", 
-                ha='center', va='center', fontsize=24, fontweight='bold',
-                transform=fig.transFigure)
-        fig.text(0.5, 0.5, f"{uniquename}", 
-                ha='center', va='center', fontsize=18,
-                transform=fig.transFigure)
-        fig.text(0.5, 0.4, "4R Manipulator Path Planning", 
-                ha='center', va='center', fontsize=16,
-                transform=fig.transFigure)
-        pdf.savefig(fig, bbox_inches='tight', dpi=300)
-        plt.close()
-        
-        # Task 1A
-        content = """Comparison of Discretized vs Continuous Orientation Space:
+def _title_figure(uniquename):
+    """Title page with proper margins."""
+    from matplotlib.figure import Figure
+
+    fig = Figure(figsize=(8.5, 11))
+    # Title respects side margins (centered but within margins)
+    fig.text(0.5, 0.6, "PS2: Path Planning with RRT", 
+            ha='center', va='center', fontsize=24, fontweight='bold',
+            transform=fig.transFigure)
+    fig.text(0.5, 0.5, f"{uniquename}", 
+            ha='center', va='center', fontsize=18,
+            transform=fig.transFigure)
+    fig.text(0.5, 0.4, "4R Manipulator Path Planning", 
+            ha='center', va='center', fontsize=16,
+            transform=fig.transFigure)
+    return fig
+
+
+def _page_figure(page):
+    if page["kind"] == "title":
+        return _title_figure(page["uniquename"])
+    return _text_figure(page["title"], page["content"], page["image_path"])
+
+
+def add_text_page(pdf, title, content, image_path=None):
+    """Add a page with proper margins (1 inch on all sides)."""
+    pdf.savefig(_text_figure(title, content, image_path), bbox_inches='tight', dpi=300)
+
+
+def text_page(title, content, image_path=None):
+    return {"kind": "text", "title": title, "content": content, "image_path": image_path}
+
+
+def report_pages(uniquename="yourname"):
+    """Pages of the PS2 write-up in order, as plain data (see _page_figure)."""
+    pages = [{"kind": "title", "uniquename": uniquename}]
+
+    # Task 1A
+    content = """Comparison of Discretized vs Continuous Orientation Space:
 
 In PS1, we worked with discretized orientation space where angles were limited to a finite set of values. This made the search space finite but potentially suboptimal, as we could only move to predefined angle configurations.
 
@@ -92,12 +122,11 @@ However, continuous space requires:
 • More sophisticated distance metrics for nearest neighbor search
 
 The continuous approach provides superior path quality at the cost of requiring probabilistic sampling methods."""
-        
-        add_text_page(pdf, "Task 1A: Visualization of Start and Goal States", 
-                     content, "task_1a_start_goal.png")
-        
-        # Task 1B
-        content = """Observations on Collision Checking:
+    
+    pages.append(text_page("Task 1A: Visualization of Start and Goal States", content, "task_1a_start_goal.png"))
+    
+    # Task 1B
+    content = """Observations on Collision Checking:
 
 The check_collision() function correctly identifies when the manipulator links intersect with circular obstacles. The function:
 • Checks all 4 links of the manipulator
@@ -109,12 +138,11 @@ From the visualizations, we can see that:
 • Others cause collisions with obstacles (red labels)
 • The collision detection properly accounts for the entire link geometry, not just joint positions
 • The algorithm correctly distinguishes between free and colliding configurations"""
-        
-        add_text_page(pdf, "Task 1B: Random Configurations", 
-                     content, "task_1b_random_configs.png")
-        
-        # Task 2A
-        content = """Implementation of Collision Check Between Configurations:
+    
+    pages.append(text_page("Task 1B: Random Configurations", content, "task_1b_random_configs.png"))
+    
+    # Task 2A
+    content = """Implementation of Collision Check Between Configurations:
 
 To check collision between two configurations, I interpolate a sequence of configurations connecting them using angle_linspace(). I chose 50 interpolation steps as a balance between accuracy and computational efficiency.
 
@@ -125,12 +153,11 @@ The visualization shows:
 • Right: A path that collides with obstacles in intermediate configurations, even though both endpoints are valid
 
 This demonstrates the importance of checking the entire path, not just the endpoints. Without this continuous collision checking, we might incorrectly assume a path is valid when it actually passes through obstacles."""
-        
-        add_text_page(pdf, "Task 2A: Collision Check Between Configurations", 
-                     content, "task_2a_collision_check.png")
-        
-        # Task 2B
-        content = """RRT Algorithm Implementation:
+    
+    pages.append(text_page("Task 2A: Collision Check Between Configurations", content, "task_2a_collision_check.png"))
+    
+    # Task 2B
+    content = """RRT Algorithm Implementation:
 
 The RRT algorithm was implemented with the following components:
 
@@ -150,11 +177,11 @@ Results:
 • Successfully found a path from start to goal
 • Video saved as solve_4R.mp4 showing the complete motion
 • The algorithm explores the configuration space efficiently using random sampling"""
-        
-        add_text_page(pdf, "Task 2B: RRT Algorithm Implementation", content)
-        
-        # Task 2C - with actual statistics
-        content = """Statistics from RRT Execution:
+    
+    pages.append(text_page("Task 2B: RRT Algorithm Implementation", content))
+    
+    # Task 2C - with actual statistics
+    content = """Statistics from RRT Execution:
 
 Main RRT Run (Task 2B):
 • Goal reached at iteration: 5822
@@ -183,11 +210,11 @@ Observations across multiple runs:
 • Path length varies but generally finds solutions within 5000-6000 iterations
 • Some runs require more iterations depending on obstacle configuration
 • The algorithm is probabilistically complete: given enough iterations, it will find a solution if one exists"""
-        
-        add_text_page(pdf, "Task 2C: Statistics and Analysis", content)
-        
-        # Task 2D
-        content = """Distance Weight Experiments:
+    
+    pages.append(text_page("Task 2C: Statistics and Analysis", content))
+    
+    # Task 2D
+    content = """Distance Weight Experiments:
 
 I tested different weight configurations for the distance function:
 
@@ -218,11 +245,11 @@ I tested different weight configurations for the distance function:
 Comments:
 
 Different weights lead to different exploration strategies. Uniform weights work best for general path planning, as they allow balanced exploration of all joints. Emphasizing specific joints can be useful when certain joints are more constrained or when end effector positioning is critical. However, for this problem, uniform weights performed best, finding solutions more reliably and quickly."""
-        
-        add_text_page(pdf, "Task 2D: Distance Weight Analysis", content)
-        
-        # Task 2E
-        content = """Step Size Experiments:
+    
+    pages.append(text_page("Task 2D: Distance Weight Analysis", content))
+    
+    # Task 2E
+    content = """Step Size Experiments:
 
 I tested different maximum step sizes: 5, 10, 15, and 20 degrees.
 
@@ -265,13 +292,100 @@ Larger step sizes (15-20 degrees):
 • Better for open spaces
 
 The suggested step size of 10 degrees provides a good balance between exploration speed, path quality, obstacle avoidance capability, and computational efficiency. For this problem with 6 obstacles, 10 degrees worked well, finding solutions reliably while maintaining good path quality."""
-        
-        add_text_page(pdf, "Task 2E: Step Size Analysis", content)
     
+    pages.append(text_page("Task 2E: Step Size Analysis", content))
+
+    return pages
+
+
+def _page_hash(page):
+    # page text, image bytes and the layout code: a page is re-rendered if any of them changes
+    digest = hashlib.sha256(json.dumps(page, sort_keys=True).encode())
+    for layout_fn in (_text_figure, _title_figure):
+        digest.update(inspect.getsource(layout_fn).encode())
+    image_path = page.get("image_path")
+    if image_path and os.path.exists(image_path):
+        with open(image_path, "rb") as f:
+            digest.update(f.read())
+    return digest.hexdigest()[:32]
+
+
+def _render_page(page, path):
+    # write to a temporary file first, so an interrupted build never leaves a broken page in the cache;
+    # the name is unique per process, as a concurrent build may render the same page
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    _page_figure(page).savefig(tmp_path, format="pdf", bbox_inches='tight', dpi=300)
+    os.replace(tmp_path, path)
+
+
+def _build_incremental(pages, pdf_filename, pdf_writer, n_workers=None):
+    """
+    Renders the pages missing from the cache of this document in a process pool and merges all cached pages.
+    Every output file has its own subdirectory of CACHE_DIR, so builds of other documents keep their pages.
+    :return: number of rendered pages
+    """
+    pdf_path = os.path.abspath(pdf_filename)
+    name = os.path.splitext(os.path.basename(pdf_path))[0]
+    cache_dir = os.path.join(CACHE_DIR, f"{name}-{hashlib.sha256(pdf_path.encode()).hexdigest()[:8]}")
+    os.makedirs(cache_dir, exist_ok=True)
+    # images are read relative to the working directory: resolve them once, so the hash covers the file
+    # that is actually rendered
+    pages = [dict(page, image_path=os.path.abspath(page["image_path"])) if page.get("image_path") else page
+             for page in pages]
+    page_files = [os.path.join(cache_dir, _page_hash(page) + ".pdf") for page in pages]
+    missing = {path: page for page, path in zip(pages, page_files) if not os.path.exists(path)}
+    if n_workers is None:
+        n_workers = os.cpu_count() or 1
+    n_workers = min(n_workers, len(missing))
+    if n_workers > 1:
+        with ProcessPoolExecutor(max_workers=n_workers) as executor:
+            list(executor.map(_render_page, missing.values(), missing.keys()))
+    else:
+        for path, page in missing.items():
+            _render_page(page, path)
+
+    writer = pdf_writer()
+    for path in page_files:
+        writer.append(path)
+    with open(pdf_filename, "wb") as f:
+        writer.write(f)
+    # drop pages that are no longer part of the report, but not the temporary files of a concurrent build
+    for filename in os.listdir(cache_dir):
+        path = os.path.join(cache_dir, filename)
+        if filename.endswith(".pdf") and path not in page_files:
+            os.remove(path)
+    return len(missing)
+
+
+def generate_pdf(uniquename="yourname", n_workers=None, use_cache=True):
+    """Generate camera-ready PDF write-up for PS2."""
+    pdf_filename = f"{uniquename}_ps2.pdf"
+    pages = report_pages(uniquename)
+
+    try:
+        from pypdf import PdfWriter
+    except ImportError:
+        PdfWriter = None
+    if use_cache and PdfWriter is not None:
+        n_rendered = _build_incremental(pages, pdf_filename, PdfWriter, n_workers)
+        print(f"Rendered {n_rendered} of {len(pages)} pages, the rest came from {CACHE_DIR}")
+    else:
+        if use_cache:
+            print("pypdf is not installed, rendering all pages serially")
+        from matplotlib.backends.backend_pdf import PdfPages
+
+        with PdfPages(pdf_filename) as pdf:
+            for page in pages:
+                pdf.savefig(_page_figure(page), bbox_inches='tight', dpi=300)
+
     print(f"PDF generated: {pdf_filename}")
     print("Please replace 'yourname' with your actual uniquename in the filename!")
 
 
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Generate the PS2 write-up")
+    parser.add_argument("--workers", type=int, default=None, help="rendering processes (default: all cores)")
+    parser.add_argument("--no-cache", action="store_true", help="render every page serially, without the cache")
+    args = parser.parse_args()
     # IMPORTANT: Replace 'yourname' with your actual uniquename
-    generate_pdf(uniquename="yourname")
+    generate_pdf(uniquename="yourname", n_workers=args.workers, use_cache=not args.no_cache)
@@ -0,0 +1,130 @@
+"""
+Array kernels for forward kinematics and collision checks of the planar manipulator.
+
+Two backends give the same results, up to the rounding of sin/cos (see test_kernels.py):
+  - "numpy": vectorized NumPy, always available;
+  - "numba": compiled loops without temporaries and with early exit on the first hit, used when
+    Numba is installed (see kernels_numba.py, imported on the first kernel call).
+The backend is chosen at runtime with get_kernels(backend) or the PLANNING_KERNELS environment variable
+("auto" by default, which picks Numba if it can be imported and NumPy otherwise).
+"""
+
+import importlib.util
+import os
+import warnings
+import numpy as np
+
+BACKENDS = ("numpy", "numba")
+_backend_functions = {}  # backend name -> (forward_kinematics, configs_in_collision, edges_in_collision)
+
+
+def _wrap(angles):
+    return ((angles + 180) % 360) - 180
+
+
+# NumPy backend
+# ======================================
+
+def _forward_kinematics_numpy(angles: np.ndarray) -> np.ndarray:
+    cumulative = np.cumsum(np.deg2rad(angles), axis=1)
+    steps = np.stack([np.cos(cumulative), np.sin(cumulative)], axis=2)
+    joints = np.zeros((angles.shape[0], angles.shape[1] + 1, 2))
+    np.cumsum(steps, axis=1, out=joints[:, 1:, :])
+    return joints
+
+
+def _configs_in_collision_numpy(joints: np.ndarray, obstacles: np.ndarray, threshold: float) -> np.ndarray:
+    p1 = joints[:, :-1, None, :]  # (N, links, 1, 2)
+    d = joints[:, 1:, None, :] - p1
+    p0 = obstacles[None, None, :, :2]  # (1, 1, obstacles, 2)
+    r = obstacles[:, 2] + threshold
+    # distance from each obstacle center to the closest point of each link
+    t = np.sum((p0 - p1) * d, axis=3) / np.sum(d * d, axis=3)
+    closest = p1 + np.clip(t, 0.0, 1.0)[..., None] * d
+    dist = np.linalg.norm(p0 - closest, axis=3)
+    return (dist <= r).any(axis=(1, 2))
+
+
+def _edges_in_collision_numpy(angles1: np.ndarray, angles2: np.ndarray, n_steps: int,
+                              obstacles: np.ndarray, threshold: float,
+                              max_configs_per_check: int = 200000) -> np.ndarray:
+    result = np.zeros(len(angles1), dtype=bool)
+    t = np.linspace(0.0, 1.0, n_steps + 1)[None, :, None]
+    edges_per_check = max(1, max_configs_per_check // (n_steps + 1))
+    for i in range(0, len(angles1), edges_per_check):
+        a, b = angles1[i:i + edges_per_check], angles2[i:i + edges_per_check]
+        configs = _wrap(a[:, None, :] + t * _wrap(b - a)[:, None, :]).reshape(-1, a.shape[1])
+        collision = _configs_in_collision_numpy(_forward_kinematics_numpy(configs), obstacles, threshold)
+        result[i:i + edges_per_check] = collision.reshape(len(a), n_steps + 1).any(axis=1)
+    return result
+
+
+def _numba_available() -> bool:
+    return importlib.util.find_spec("numba") is not None
+
+
+def _load_backend(name: str) -> tuple:
+    if name not in _backend_functions:
+        if name == "numba":
+            import kernels_numba
+            _backend_functions[name] = (kernels_numba.forward_kinematics, kernels_numba.configs_in_collision,
+                                        kernels_numba.edges_in_collision)
+        else:
+            _backend_functions[name] = (_forward_kinematics_numpy, _configs_in_collision_numpy,
+                                        _edges_in_collision_numpy)
+    return _backend_functions[name]
+
+
+class Kernels:
+
+    def __init__(self, name: str):
+        """
+        Kernels of one backend, see get_kernels(). The backend is loaded on the first call, so creating
+        Kernels is cheap and they pickle by name.
+        """
+        self.name = name
+
+    def forward_kinematics(self, angles: np.ndarray) -> np.ndarray:
+        """
+        :param angles: configurations in degrees. Shape: (N, n_links).
+        :return: joint positions. Shape: (N, n_links + 1, 2).
+        """
+        forward_kinematics, _, _ = _load_backend(self.name)
+        return forward_kinematics(np.ascontiguousarray(angles, dtype=np.float64))
+
+    def configs_in_collision(self, joints: np.ndarray, obstacles: np.ndarray, threshold: float) -> np.ndarray:
+        """
+        :param joints: joint positions. Shape: (N, n_links + 1, 2).
+        :param obstacles: circles as rows of (x, y, radius)
+        :return: True where a link is within threshold of an obstacle. Shape: (N,).
+        """
+        _, configs_in_collision, _ = _load_backend(self.name)
+        return configs_in_collision(np.ascontiguousarray(joints, dtype=np.float64),
+                                    np.ascontiguousarray(obstacles, dtype=np.float64), float(threshold))
+
+    def edges_in_collision(self, angles1: np.ndarray, angles2: np.ndarray, n_steps: int,
+                           obstacles: np.ndarray, threshold: float) -> np.ndarray:
+        """
+        Sweeps the shortest-angle edges angles1[i] -> angles2[i] in n_steps interpolation steps.
+        :return: True where any configuration along the edge is in collision. Shape: (n_edges,).
+        """
+        _, _, edges_in_collision = _load_backend(self.name)
+        return edges_in_collision(np.ascontiguousarray(angles1, dtype=np.float64),
+                                  np.ascontiguousarray(angles2, dtype=np.float64), int(n_steps),
+                                  np.ascontiguousarray(obstacles, dtype=np.float64), float(threshold))
+
+
+def get_kernels(backend: str = None) -> Kernels:
+    """
+    :param backend: "numpy", "numba" or "auto". If None, read from the PLANNING_KERNELS environment variable.
+        Falls back to NumPy with a warning if Numba is requested but not installed.
+    """
+    if backend is None:
+        backend = os.environ.get("PLANNING_KERNELS", "auto")
+    assert backend in BACKENDS + ("auto",), f"Unknown kernel backend: {backend}"
+    if backend == "auto":
+        backend = "numba" if _numba_available() else "numpy"
+    if backend == "numba" and not _numba_available():
+        warnings.warn("Numba is not installed, using the NumPy kernels")
+        backend = "numpy"
+    return Kernels(backend)
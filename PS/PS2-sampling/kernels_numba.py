@@ -0,0 +1,79 @@
+"""
+Numba backend of kernels.py. Imported by kernels.get_kernels() on first use only, since importing Numba
+takes several times longer than importing NumPy.
+"""
+
+import numba
+import numpy as np
+
+
+@numba.njit(cache=True)
+def _fk_row(angles, joints):
+    # same operation order as the NumPy backend, so both give bitwise identical joints
+    angle_sum = 0.0
+    x = 0.0
+    y = 0.0
+    joints[0, 0] = 0.0
+    joints[0, 1] = 0.0
+    for k in range(angles.shape[0]):
+        angle_sum += np.deg2rad(angles[k])
+        x += np.cos(angle_sum)
+        y += np.sin(angle_sum)
+        joints[k + 1, 0] = x
+        joints[k + 1, 1] = y
+
+
+@numba.njit(cache=True)
+def _config_collides(joints, obstacles, threshold):
+    for o in range(obstacles.shape[0]):
+        r = obstacles[o, 2] + threshold
+        for i in range(joints.shape[0] - 1):
+            dx = joints[i + 1, 0] - joints[i, 0]
+            dy = joints[i + 1, 1] - joints[i, 1]
+            px = obstacles[o, 0] - joints[i, 0]
+            py = obstacles[o, 1] - joints[i, 1]
+            t = (px * dx + py * dy) / (dx * dx + dy * dy)
+            t = min(max(t, 0.0), 1.0)
+            cx = obstacles[o, 0] - (joints[i, 0] + t * dx)
+            cy = obstacles[o, 1] - (joints[i, 1] + t * dy)
+            if np.sqrt(cx * cx + cy * cy) <= r:
+                return True
+    return False
+
+
+@numba.njit(cache=True)
+def forward_kinematics(angles):
+    joints = np.empty((angles.shape[0], angles.shape[1] + 1, 2))
+    for n in range(angles.shape[0]):
+        _fk_row(angles[n], joints[n])
+    return joints
+
+
+@numba.njit(cache=True)
+def configs_in_collision(joints, obstacles, threshold):
+    result = np.zeros(joints.shape[0], dtype=np.bool_)
+    for n in range(joints.shape[0]):
+        result[n] = _config_collides(joints[n], obstacles, threshold)
+    return result
+
+
+@numba.njit(cache=True)
+def edges_in_collision(angles1, angles2, n_steps, obstacles, threshold):
+    n_joints = angles1.shape[1]
+    result = np.zeros(angles1.shape[0], dtype=np.bool_)
+    config = np.empty(n_joints)
+    diff = np.empty(n_joints)
+    joints = np.empty((n_joints + 1, 2))
+    step = 1.0 / n_steps
+    for e in range(angles1.shape[0]):
+        for k in range(n_joints):
+            diff[k] = ((angles2[e, k] - angles1[e, k] + 180) % 360) - 180
+        for s in range(n_steps + 1):
+            t = s * step if s < n_steps else 1.0  # like np.linspace
+            for k in range(n_joints):
+                config[k] = ((angles1[e, k] + t * diff[k] + 180) % 360) - 180
+            _fk_row(config, joints)
+            if _config_collides(joints, obstacles, threshold):
+                result[e] = True
+                break
+    return result
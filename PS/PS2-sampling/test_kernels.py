@@ -0,0 +1,116 @@
+"""
+Checks every kernel backend against the NumPy reference and against closed-form cases:
+    python -m pytest test_kernels.py
+
+Joint positions are compared with a tolerance, as sin/cos may differ in the last bits between libm,
+SIMD and Numba implementations. Collision flags must be equal, except for configurations whose
+clearance is within that tolerance of the threshold, where either answer is correct.
+"""
+
+import numpy as np
+import pytest
+
+from kernels import BACKENDS, _numba_available, _wrap, get_kernels
+
+TOLERANCE = 1e-9
+THRESHOLD = 0.1
+
+backends = pytest.mark.parametrize("backend", [
+    pytest.param(name, marks=pytest.mark.skipif(name == "numba" and not _numba_available(),
+                                                reason="Numba is not installed"))
+    for name in BACKENDS])
+
+
+def random_obstacles(rng, n=8):
+    return np.concatenate([rng.uniform(-4, 4, (n, 2)), rng.uniform(0.1, 0.6, (n, 1))], axis=1)
+
+
+def clearance(joints: np.ndarray, obstacles: np.ndarray) -> np.ndarray:
+    """
+    :return: smallest distance from a link to the border of an obstacle. Shape: (N,).
+    """
+    p1 = joints[:, :-1, None, :]
+    d = joints[:, 1:, None, :] - p1
+    p0 = obstacles[None, None, :, :2]
+    t = np.clip(np.sum((p0 - p1) * d, axis=3) / np.sum(d * d, axis=3), 0.0, 1.0)
+    dist = np.linalg.norm(p0 - (p1 + t[..., None] * d), axis=3) - obstacles[:, 2]
+    return dist.min(axis=(1, 2))
+
+
+def assert_flags_equal(flags, expected, clearances):
+    borderline = np.abs(clearances - THRESHOLD) <= TOLERANCE
+    assert np.array_equal(flags[~borderline], expected[~borderline])
+
+
+@backends
+def test_forward_kinematics_closed_form(backend):
+    kernels = get_kernels(backend)
+    angles = np.array([[0.0, 0.0, 0.0, 0.0],
+                       [90.0, 0.0, 0.0, 0.0],
+                       [90.0, -90.0, 180.0, 90.0]])
+    expected = np.array([[[0, 0], [1, 0], [2, 0], [3, 0], [4, 0]],
+                         [[0, 0], [0, 1], [0, 2], [0, 3], [0, 4]],
+                         [[0, 0], [0, 1], [1, 1], [0, 1], [0, 0]]], dtype=float)
+    np.testing.assert_allclose(kernels.forward_kinematics(angles), expected, atol=TOLERANCE)
+
+
+@backends
+@pytest.mark.parametrize("n_links", [2, 4, 7])
+def test_forward_kinematics_matches_numpy(backend, n_links):
+    rng = np.random.default_rng(n_links)
+    angles = rng.uniform(-180, 180, (2000, n_links))
+    np.testing.assert_allclose(get_kernels(backend).forward_kinematics(angles),
+                               get_kernels("numpy").forward_kinematics(angles), rtol=0, atol=TOLERANCE)
+
+
+@backends
+def test_configs_in_collision_single_obstacle(backend):
+    kernels = get_kernels(backend)
+    # a straight 4-link arm along the x axis, an obstacle of radius 0.5 centered above its second link
+    joints = kernels.forward_kinematics(np.zeros((1, 4)))
+    for height, expected in ((0.55, True), (0.65, False), (-0.55, True)):
+        obstacles = np.array([[1.5, height, 0.5]])
+        assert kernels.configs_in_collision(joints, obstacles, THRESHOLD)[0] == expected
+    # beyond the tip of the arm, the distance is measured to the end point
+    assert kernels.configs_in_collision(joints, np.array([[4.55, 0.0, 0.5]]), THRESHOLD)[0]
+    assert not kernels.configs_in_collision(joints, np.array([[4.65, 0.0, 0.5]]), THRESHOLD)[0]
+
+
+@backends
+@pytest.mark.parametrize("n_links", [2, 4, 7])
+def test_configs_in_collision_matches_numpy(backend, n_links):
+    rng = np.random.default_rng(n_links)
+    obstacles = random_obstacles(rng)
+    joints = get_kernels("numpy").forward_kinematics(rng.uniform(-180, 180, (2000, n_links)))
+    flags = get_kernels(backend).configs_in_collision(joints, obstacles, THRESHOLD)
+    clearances = clearance(joints, obstacles)
+    assert flags.any() and not flags.all()
+    assert_flags_equal(flags, clearances <= THRESHOLD, clearances)
+
+
+@backends
+@pytest.mark.parametrize("n_links", [2, 4, 7])
+def test_edges_in_collision_matches_swept_configs(backend, n_links):
+    rng = np.random.default_rng(n_links)
+    obstacles = random_obstacles(rng)
+    n_edges, n_steps = 500, 50
+    angles1 = rng.uniform(-180, 180, (n_edges, n_links))
+    angles2 = _wrap(angles1 + rng.normal(0, 30, angles1.shape))
+    flags = get_kernels(backend).edges_in_collision(angles1, angles2, n_steps, obstacles, THRESHOLD)
+    # the configurations of every edge, the shortest way around every joint
+    t = np.linspace(0.0, 1.0, n_steps + 1)[None, :, None]
+    configs = _wrap(angles1[:, None, :] + t * _wrap(angles2 - angles1)[:, None, :]).reshape(-1, n_links)
+    clearances = clearance(get_kernels("numpy").forward_kinematics(configs), obstacles).reshape(n_edges, -1)
+    min_clearances = clearances.min(axis=1)
+    assert flags.any() and not flags.all()
+    assert_flags_equal(flags, min_clearances <= THRESHOLD, min_clearances)
+
+
+@backends
+def test_edges_across_the_angle_wrap(backend):
+    kernels = get_kernels(backend)
+    # the short way from 170 to -170 degrees passes 180, where the obstacle is; the long way would not
+    obstacles = np.array([[-2.0, 0.0, 0.15]])
+    angles1, angles2 = np.array([[170.0, 0.0]]), np.array([[-170.0, 0.0]])
+    assert kernels.edges_in_collision(angles1, angles2, 20, obstacles, THRESHOLD)[0]
+    assert not kernels.edges_in_collision(angles1, angles1, 20, obstacles, THRESHOLD)[0]
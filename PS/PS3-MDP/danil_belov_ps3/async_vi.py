@@ -0,0 +1,176 @@
+import numpy as np
+from utils import *
+from vi import VI
+from mdp import MDP, SparseTransitions
+
+MODES = ("gauss_seidel", "prioritized")
+
+
+def goal_outward_layers(neighbors: np.ndarray, goal_id: int) -> list:
+    """
+    States grouped by their number of moves to the goal (breadth-first search from the goal),
+    without the goal itself. States that can't reach the goal form the last layer.
+    """
+    dist = np.full(len(neighbors), -1)
+    dist[goal_id] = 0
+    frontier = np.array([goal_id])
+    layers = []
+    while len(frontier):
+        nxt = neighbors[frontier].ravel()
+        nxt = np.unique(nxt[nxt >= 0])
+        nxt = nxt[dist[nxt] < 0]
+        dist[nxt] = len(layers) + 1
+        if len(nxt):
+            layers.append(nxt)
+        frontier = nxt
+    unreachable = np.flatnonzero(dist < 0)
+    if len(unreachable):
+        layers.append(unreachable)
+    return layers
+
+
+def changed(old: np.ndarray, new: np.ndarray, threshold: float) -> np.ndarray:
+    """The negation of np.isclose(old, new, atol=threshold), the convergence test of the sweep solvers"""
+    return np.abs(new - old) > threshold + 1e-5 * np.abs(new)
+
+
+def prioritized_sweeping(backup, neighbors: np.ndarray, values: np.ndarray, fixed_id: int, threshold: float,
+                         max_batches: int, batch_fraction: float = 0.1) -> tuple:
+    """
+    Prioritized sweeping in vectorized batches: every batch backs up at once the states whose Bellman residual
+    is above threshold and at least batch_fraction of the largest one, then recomputes the backups of these
+    states and of their neighbors (their predecessors, as the moves are symmetric). Stops when no residual is
+    above threshold, or after max_batches batches.
+    backup(states) gives the backed up values of the states, values are updated in place,
+    values[fixed_id] is never updated
+    output: (number of backups, number of batches, whether the residuals are below threshold)
+    """
+    new = backup(np.arange(len(values)))
+    new[fixed_id] = values[fixed_id]
+    n_updates = 0
+    for n_batches in range(max_batches + 1):
+        residual = np.abs(new - values)
+        pending = np.flatnonzero(residual > threshold)
+        if not len(pending) or n_batches == max_batches:
+            return n_updates, n_batches, not len(pending)
+        batch = pending[residual[pending] >= batch_fraction * residual[pending].max()]
+        values[batch] = new[batch]
+        n_updates += len(batch)
+        affected = np.concatenate([neighbors[batch].ravel(), batch])
+        affected = np.unique(affected[(affected >= 0) & (affected != fixed_id)])
+        new[affected] = backup(affected)
+
+
+class GaussSeidelVI(VI):
+
+    def __init__(self,
+                 env: Environment,
+                 goal: tuple,
+                 mode: str = "gauss_seidel",
+                 threshold: float = 1e-6):
+        """
+        Deterministic value iteration with in-place (asynchronous) updates.
+        mode "gauss_seidel": sweeps over the states ordered outward from the goal, each layer of states at
+            the same distance from the goal is backed up at once with the values of the inner layers
+            already updated in this sweep, so the reachable cost-to-go is exact after the first sweep
+        mode "prioritized": prioritized sweeping, only states whose Bellman residual is above threshold
+            are backed up, in batches of the largest residuals (see prioritized_sweeping)
+        Same interface and conventions as VI (1e6 for blocked actions, G*(goal) = 0).
+        """
+        super().__init__(env, goal)
+        assert mode in MODES, f"Unknown mode: {mode}"
+        self._mode = mode
+        self._threshold = threshold
+
+    def _backup(self, G: np.ndarray, neighbors: np.ndarray) -> np.ndarray:
+        # min_a l(s,a) + G(f(s,a)) for rows of the neighbor table
+        return np.where(neighbors >= 0, 1.0 + G[neighbors], 1e6).min(axis=1)
+
+    def calculate_value_function(self, max_iterations: int = 1000, initial_values: np.ndarray = None):
+        """
+        max_iterations: sweeps (gauss_seidel) or batches of backups (prioritized)
+        """
+        tables = self._env.tables()
+        neighbors = tables.neighbors
+        goal_id = tables.state_id(self._goal)
+        G = np.full(len(tables.states), 1e6) if initial_values is None else tables.from_grid(initial_values).astype(float)
+        G[goal_id] = 0.0
+        if self._mode == "gauss_seidel":
+            layers = [(layer, neighbors[layer]) for layer in goal_outward_layers(neighbors, goal_id)]
+            for iteration in range(max_iterations):
+                any_changed = False
+                for layer, layer_neighbors in layers:
+                    G_layer = self._backup(G, layer_neighbors)
+                    any_changed |= changed(G[layer], G_layer, self._threshold).any()
+                    G[layer] = G_layer
+                if not any_changed:
+                    print(f"Gauss-Seidel VI converged after {iteration + 1} sweeps")
+                    break
+        else:
+            n_updates, n_batches, converged = prioritized_sweeping(
+                lambda states: self._backup(G, neighbors[states]), neighbors, G, goal_id, self._threshold,
+                max_iterations)
+            print(f"Prioritized sweeping VI {'converged' if converged else 'stopped'} after {n_updates} backups "
+                  f"in {n_batches} batches")
+        self._G = tables.to_grid(G, fill=1e6)
+        return self._G
+
+
+class GaussSeidelMDP(MDP):
+
+    def __init__(self,
+                 env: Environment,
+                 goal: tuple,
+                 gamma: float = 0.99,
+                 mode: str = "gauss_seidel",
+                 threshold: float = 1e-6):
+        """
+        Stochastic value iteration with in-place (asynchronous) updates over SparseTransitions,
+        with the same modes as GaussSeidelVI. Same interface as MDP, with v*(goal) = 1 fixed.
+        """
+        super().__init__(env, goal, gamma, engine="sparse")
+        assert mode in MODES, f"Unknown mode: {mode}"
+        self._mode = mode
+        self._threshold = threshold
+
+    def calculate_value_function(self, max_iterations: int = 1000, initial_values: np.ndarray = None):
+        """
+        max_iterations: sweeps (gauss_seidel) or batches of backups (prioritized)
+        """
+        T = self.transitions()
+        A = len(action_space)
+        V = np.zeros(len(T.states)) if initial_values is None else T.from_grid(initial_values).astype(float)
+        V[T.goal_id] = 1.0
+        if self._mode == "gauss_seidel":
+            layers = []
+            for layer in goal_outward_layers(T.tables.neighbors, T.goal_id):
+                rows = (layer[:, None] * A + np.arange(A)).ravel()
+                layers.append((layer, T.P[rows], T.R[rows]))
+            for iteration in range(max_iterations):
+                any_changed = False
+                for layer, P_layer, R_layer in layers:
+                    V_layer = (R_layer + self._gamma * (P_layer @ V)).reshape(-1, A).max(axis=1)
+                    any_changed |= changed(V[layer], V_layer, self._threshold).any()
+                    V[layer] = V_layer
+                if not any_changed:
+                    print(f"Gauss-Seidel MDP converged after {iteration + 1} sweeps")
+                    break
+        else:
+            n_updates, n_batches, converged = self._prioritized_sweeping(T, V, max_iterations)
+            print(f"Prioritized sweeping MDP {'converged' if converged else 'stopped'} after {n_updates} backups "
+                  f"in {n_batches} batches")
+        self._V = T.to_grid(V)
+        return self._V
+
+    def _prioritized_sweeping(self, T: SparseTransitions, V: np.ndarray, max_batches: int) -> tuple:
+        # Every outcome of an action is one of the moves of action_space, so a backup of s only needs the
+        # values of its 4 neighbors: Q(s,.) = r(s,.) + gamma * outcome_probs @ v(neighbors of s)
+        outcome_probs = T.tables.outcome_probs(self._env.epsilon)
+        neighbors = T.tables.neighbors
+        R = T.R.reshape(-1, len(action_space))
+
+        def backup(states):
+            V_next = np.where(neighbors[states] >= 0, V[neighbors[states]], 0.0)
+            return (R[states] + self._gamma * V_next @ outcome_probs.T).max(axis=1)
+
+        return prioritized_sweeping(backup, neighbors, V, T.goal_id, self._threshold, max_batches)
@@ -1,25 +1,97 @@
 import numpy as np
+import scipy.sparse
 from utils import *
 
 
+class SparseTransitions:
+
+    def __init__(self,
+                 env: Environment,
+                 goal: tuple,
+                 epsilon: float = None):
+        """
+        The probabilistic transition function and the rewards of env compiled once over the free cells
+        (the states of env.tables()):
+        P: CSR matrix of shape (S*A, S), row s*A + a holds P(s'|s,a) of the outcomes that stay on free cells
+        R: expected immediate reward of every row, r(s,a) = sum_{s'} P(s'|s,a) * r(s')
+        Outcomes into obstacles or out of bounds only add their reward -1, they have no future value.
+        epsilon defaults to the one of env.
+        """
+        if epsilon is None:
+            epsilon = env.epsilon
+        self.epsilon = epsilon
+        self.tables = env.tables()
+        self.shape = env.shape
+        self.states = self.tables.states  # state id -> flat cell index
+        self.index = self.tables.index  # flat cell index -> state id, negative for obstacles
+        self.goal_id = self.tables.state_id(goal)
+        assert self.goal_id >= 0, "The goal is not a free cell"
+        S, A = len(self.states), len(action_space)
+        outcome_probs = self.tables.outcome_probs(epsilon)
+
+        rows, cols, probs = [], [], []
+        self.R = np.zeros(S * A)
+        for k in range(A):
+            target = self.tables.neighbors[:, k]
+            valid = target >= 0
+            reward = np.where(valid, np.where(target == self.goal_id, 1.0, 0.0), -1.0)
+            for a in range(A):
+                self.R[a::A] += outcome_probs[a, k] * reward
+                rows.append(np.flatnonzero(valid) * A + a)
+                cols.append(target[valid])
+                probs.append(np.full(np.count_nonzero(valid), outcome_probs[a, k]))
+        self.P = scipy.sparse.csr_matrix((np.concatenate(probs), (np.concatenate(rows), np.concatenate(cols))),
+                                         shape=(S * A, S))
+
+    def q_values(self, V: np.ndarray, gamma: float) -> np.ndarray:
+        """
+        V: values of the states, shape (S,)
+        output: r(s,a) + gamma * sum_{s'} P(s'|s,a) * V(s'), shape (S, A)
+        """
+        return (self.R + gamma * (self.P @ V)).reshape(-1, len(action_space))
+
+    def to_grid(self, values: np.ndarray, fill=0) -> np.ndarray:
+        return self.tables.to_grid(values, fill)
+
+    def from_grid(self, grid: np.ndarray) -> np.ndarray:
+        return self.tables.from_grid(grid)
+
+
 class MDP:
+    ENGINES = ("sparse", "loop")
 
     def __init__(self,
                  env: Environment,
                  goal: tuple,
-                 gamma: float = 0.99):
+                 gamma: float = 0.99,
+                 engine: str = "sparse"):
         """
         env is the grid enviroment
         goal is the goal state
         gamma is the discount factor
+        engine is "sparse" (Bellman backups as sparse matrix-vector products over SparseTransitions)
+        or "loop" (cell by cell reference implementation)
         """
+        assert engine in MDP.ENGINES, f"Unknown engine: {engine}"
         self._env = env
         self._goal = goal
         self._gamma = gamma
+        self._engine = engine
+        self._transitions = None
         self._V = np.zeros(env.shape)
         self._policy = np.zeros(self._env.shape, 'b') #type byte (or numpy.int8)
 
-    def calculate_value_function(self):
+    def transitions(self) -> SparseTransitions:
+        """
+        The compiled transition model, built on first use and rebuilt when the tables of env
+        (see Environment.set_grid) or its epsilon have changed since
+        """
+        T = self._transitions
+        if T is None or T.tables is not self._env.tables() or T.epsilon != self._env.epsilon:
+            self._transitions = SparseTransitions(self._env, self._goal)
+        return self._transitions
+
+    def calculate_value_function(self, max_iterations: int = 100):
         """
         This function uses the Value Iteration algorithm to fill in the
         optimal value function
@@ -33,12 +105,14 @@ class MDP:
         - P(s'|s,a) is the probabilistic transition function
         - v*(goal) = 1 (terminal state with reward)
         """
+        if self._engine == "sparse":
+            return self._calculate_value_function_sparse(max_iterations)
+
         # Initialize: v*(goal) = 1, all other states = 0
         self._V = np.zeros(self._env.shape)
         self._V[self._goal] = 1.0
         
         # Value Iteration: iterate until convergence
-        max_iterations = 100
         for iteration in range(max_iterations):
             V_new = np.copy(self._V)
             
@@ -108,6 +182,9 @@ class MDP:
         This selects the action that maximizes the expected immediate reward plus 
         the discounted expected future value.
         """
+        if self._engine == "sparse":
+            return self._calculate_policy_sparse()
+
         # Calculate greedy policy from v*
         for i in range(self._env.shape[0]):
             for j in range(self._env.shape[1]):
@@ -154,6 +231,28 @@ class MDP:
         
         return self._policy
 
+    def _calculate_value_function_sparse(self, max_iterations: int):
+        # Same sweeps as the loop engine: one sparse mat-vec for all states and actions, then a max over actions
+        T = self.transitions()
+        V = np.zeros(len(T.states))
+        V[T.goal_id] = 1.0
+        for iteration in range(max_iterations):
+            V_new = T.q_values(V, self._gamma).max(axis=1)
+            V_new[T.goal_id] = 1.0
+            if np.allclose(V, V_new, atol=1e-6):
+                print(f"MDP converged after {iteration + 1} iterations")
+                break
+            V = V_new
+        self._V = T.to_grid(V)
+        return self._V
+
+    def _calculate_policy_sparse(self):
+        T = self.transitions()
+        # argmax returns the first of equal values, like the strict comparison of the loop engine
+        best_action = np.argmax(T.q_values(T.from_grid(self._V), self._gamma), axis=1)
+        self._policy.reshape(-1)[T.states] = best_action
+        return self._policy
+
     def policy(self,state:tuple) -> int:
         """
         returns the action according to the policy
@@ -0,0 +1,158 @@
+import numpy as np
+from utils import *
+from vi import padded_free_mask, shifted
+from mdp import SparseTransitions
+
+
+class MultiGoalVI:
+
+    def __init__(self,
+                 env: Environment,
+                 goals: list,
+                 dtype=np.float64):
+        """
+        Deterministic value iteration for many goals at once: the cost-to-go of all goals is stacked into
+        one (n_goals, H, W) array and every sweep backs up all of them together, with the same results
+        per goal as VI.
+        env is the grid enviroment
+        goals is a list of goal states
+        dtype is the storage type of the values, np.float32 halves the memory
+        """
+        self._env = env
+        self._goals = [tuple(goal) for goal in goals]
+        self._dtype = dtype
+        self._G = np.full((len(goals),) + env.shape, 1e6, dtype=dtype)
+        self._policy = np.zeros((len(goals),) + env.shape, 'b')
+
+    def _padded_values(self, G, free, out):
+        # obstacles and the border hold 1e6 - 1, so that a blocked action costs exactly 1e6 (see VI)
+        np.copyto(out[:, 1:-1, 1:-1], np.where(free[1:-1, 1:-1], G, 1e6 - 1))
+        return out
+
+    def calculate_value_function(self, max_iterations: int = 100):
+        """
+        output:
+        G: optimal cost-to-go of every goal, shape (n_goals, H, W)
+        """
+        free = padded_free_mask(self._env)
+        goal_ids = np.arange(len(self._goals))
+        goal_rows, goal_cols = np.array(self._goals).T
+        update = np.broadcast_to(free[1:-1, 1:-1], self._G.shape).copy()
+        update[goal_ids, goal_rows, goal_cols] = False
+        padded = np.full((len(self._goals),) + free.shape, 1e6 - 1, dtype=self._dtype)
+        min_next = np.empty_like(self._G)
+
+        self._G = np.full_like(self._G, 1e6)
+        self._G[goal_ids, goal_rows, goal_cols] = 0.0
+        for iteration in range(max_iterations):
+            self._padded_values(self._G, free, padded)
+            np.minimum(shifted(padded, action_space[0]), shifted(padded, action_space[1]), out=min_next)
+            for a in action_space[2:]:
+                np.minimum(min_next, shifted(padded, a), out=min_next)
+            G_new = np.where(update, min_next + self._dtype(1.0), self._G)
+            if np.allclose(self._G, G_new, atol=1e-6):
+                print(f"Multi-goal VI converged after {iteration + 1} iterations")
+                break
+            self._G = G_new
+        return self._G
+
+    def calculate_policy(self):
+        """
+        output:
+        policy: best action of every goal and state, shape (n_goals, H, W), int8
+        """
+        free = padded_free_mask(self._env)
+        padded = self._padded_values(self._G, free, np.full((len(self._goals),) + free.shape, 1e6 - 1,
+                                                            dtype=self._dtype))
+        costs = np.stack([shifted(padded, a) + 1.0 for a in action_space])
+        best_action = np.argmin(costs, axis=0).astype(self._policy.dtype)
+        mask = np.broadcast_to(free[1:-1, 1:-1], self._policy.shape)
+        self._policy[mask] = best_action[mask]
+        return self._policy
+
+    def policy(self, goal_id: int, state: tuple) -> int:
+        """
+        returns the action towards goals[goal_id] according to the policy
+        """
+        return self._policy[(goal_id,) + tuple(state)]
+
+
+class MultiGoalMDP:
+
+    def __init__(self,
+                 env: Environment,
+                 goals: list,
+                 gamma: float = 0.99,
+                 dtype=np.float64):
+        """
+        Stochastic value iteration for many goals at once. The transition matrix of SparseTransitions does not
+        depend on the goal, only the reward of reaching it does, so all goals share one matrix and every sweep
+        is a single sparse matrix times (S, n_goals) dense matrix product.
+        env is the grid enviroment
+        goals is a list of goal states
+        gamma is the discount factor
+        dtype is the storage type of the values and the transition matrix, np.float32 halves the memory
+        """
+        self._env = env
+        self._goals = [tuple(goal) for goal in goals]
+        self._gamma = gamma
+        self._dtype = dtype
+        self._T = None
+        self._compile()
+        self._V = np.zeros((len(goals),) + env.shape, dtype=dtype)
+        self._policy = np.zeros((len(goals),) + env.shape, 'b')
+
+    def _compile(self):
+        # the shared transition matrix and the per-goal rewards, rebuilt when the tables of env
+        # (see Environment.set_grid) or its epsilon have changed since they were compiled
+        T = self._T
+        if T is not None and T.tables is self._env.tables() and T.epsilon == self._env.epsilon:
+            return
+        self._T = SparseTransitions(self._env, self._goals[0])
+        self._P = self._T.P.astype(self._dtype)
+        self._goal_ids = self._T.index[np.ravel_multi_index(np.array(self._goals).T, self._env.shape)]
+        assert np.all(self._goal_ids >= 0), "A goal is not a free cell"
+        # expected rewards without the goal reward, plus the probability of reaching each goal
+        R_no_goal = self._T.R - self._T.P[:, self._T.goal_id].toarray().ravel()
+        self._R = (R_no_goal[:, None] + self._T.P[:, self._goal_ids].toarray()).astype(self._dtype)
+
+    def _q_values(self, V: np.ndarray) -> np.ndarray:
+        # shape (S, A, n_goals)
+        return (self._R + self._dtype(self._gamma) * (self._P @ V)).reshape(-1, len(action_space), len(self._goals))
+
+    def calculate_value_function(self, max_iterations: int = 100):
+        """
+        output:
+        V: optimal value function of every goal, shape (n_goals, H, W)
+        """
+        self._compile()
+        goal_index = (self._goal_ids, np.arange(len(self._goals)))
+        V = np.zeros((len(self._T.states), len(self._goals)), dtype=self._dtype)
+        V[goal_index] = 1.0
+        for iteration in range(max_iterations):
+            V_new = self._q_values(V).max(axis=1)
+            V_new[goal_index] = 1.0
+            if np.allclose(V, V_new, atol=1e-6):
+                print(f"Multi-goal MDP converged after {iteration + 1} iterations")
+                break
+            V = V_new
+        self._V = np.stack([self._T.to_grid(V[:, k]) for k in range(len(self._goals))])
+        return self._V
+
+    def calculate_policy(self):
+        """
+        output:
+        policy: greedy action of every goal and state, shape (n_goals, H, W), int8
+        """
+        self._compile()
+        V = self._V.reshape(len(self._goals), -1)[:, self._T.states].T
+        best_action = np.argmax(self._q_values(V), axis=1).astype(self._policy.dtype)
+        for k in range(len(self._goals)):
+            self._policy[k].reshape(-1)[self._T.states] = best_action[:, k]
+        return self._policy
+
+    def policy(self, goal_id: int, state: tuple) -> int:
+        """
+        returns the action towards goals[goal_id] according to the policy
+        """
+        return self._policy[(goal_id,) + tuple(state)]
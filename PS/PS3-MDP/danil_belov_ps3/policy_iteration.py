@@ -0,0 +1,112 @@
+import numpy as np
+import scipy.sparse
+import scipy.sparse.linalg
+from utils import *
+from mdp import MDP, SparseTransitions
+
+
+def policy_model(T: SparseTransitions, pi: np.ndarray):
+    """
+    Transition matrix and rewards of a fixed policy pi (action index per state):
+    P_pi of shape (S, S) and R_pi of shape (S,)
+    """
+    rows = np.arange(len(pi)) * len(action_space) + pi
+    return T.P[rows], T.R[rows]
+
+
+def greedy_policy(T: SparseTransitions, V: np.ndarray, gamma: float, pi: np.ndarray = None) -> np.ndarray:
+    """
+    argmax_a [r(s,a) + gamma * sum_{s'} P(s'|s,a) * V(s')] of every state.
+    If the current policy pi is given, its action is kept where it is still optimal, so that
+    policy iteration does not cycle between equally good actions.
+    """
+    Q = T.q_values(V, gamma)
+    best = np.argmax(Q, axis=1)
+    if pi is None:
+        return best
+    states = np.arange(len(pi))
+    keep = Q[states, pi] >= Q[states, best] - 1e-12
+    return np.where(keep, pi, best)
+
+
+class PolicyIteration(MDP):
+
+    def __init__(self,
+                 env: Environment,
+                 goal: tuple,
+                 gamma: float = 0.99):
+        """
+        Policy iteration: exact evaluation of the current policy with a sparse linear solve,
+        then greedy improvement, until the policy is stable.
+        Same interface as MDP, with v*(goal) = 1 fixed.
+        """
+        super().__init__(env, goal, gamma, engine="sparse")
+
+    def evaluate_policy(self, pi: np.ndarray) -> np.ndarray:
+        """
+        Solves v_pi = R_pi + gamma * P_pi v_pi with v_pi(goal) = 1, i.e.
+        (I - gamma * P_pi) v_pi = R_pi with the goal row replaced by v_pi(goal) = 1.
+        """
+        T = self.transitions()
+        P_pi, R_pi = policy_model(T, pi)
+        not_goal = np.ones(len(pi))
+        not_goal[T.goal_id] = 0.0
+        A = scipy.sparse.identity(len(pi), format='csr') - self._gamma * (scipy.sparse.diags(not_goal) @ P_pi)
+        b = R_pi.copy()
+        b[T.goal_id] = 1.0
+        return scipy.sparse.linalg.spsolve(A.tocsc(), b)
+
+    def calculate_value_function(self, max_iterations: int = 100):
+        T = self.transitions()
+        V = np.zeros(len(T.states))
+        V[T.goal_id] = 1.0
+        pi = greedy_policy(T, V, self._gamma)
+        for iteration in range(max_iterations):
+            V = self.evaluate_policy(pi)
+            pi_new = greedy_policy(T, V, self._gamma, pi)
+            if np.array_equal(pi, pi_new):
+                print(f"Policy iteration converged after {iteration + 1} iterations")
+                break
+            pi = pi_new
+        self._V = T.to_grid(V)
+        return self._V
+
+
+class ModifiedPolicyIteration(MDP):
+
+    def __init__(self,
+                 env: Environment,
+                 goal: tuple,
+                 gamma: float = 0.99,
+                 k: int = 20):
+        """
+        Modified policy iteration: the greedy policy is evaluated approximately with k sweeps of
+        v <- R_pi + gamma * P_pi v (no max over actions) before the next improvement.
+        k = 0 is value iteration, k -> infinity is policy iteration.
+        Same interface as MDP, with v*(goal) = 1 fixed.
+        """
+        super().__init__(env, goal, gamma, engine="sparse")
+        self._k = k
+
+    def calculate_value_function(self, max_iterations: int = 100):
+        T = self.transitions()
+        V = np.zeros(len(T.states))
+        V[T.goal_id] = 1.0
+        states = np.arange(len(V))
+        for iteration in range(max_iterations):
+            # improvement: the greedy backup, i.e. one value iteration sweep
+            Q = T.q_values(V, self._gamma)
+            pi = np.argmax(Q, axis=1)
+            V_new = Q[states, pi]
+            V_new[T.goal_id] = 1.0
+            if np.allclose(V, V_new, atol=1e-6):
+                print(f"Modified policy iteration converged after {iteration + 1} iterations")
+                break
+            # partial evaluation of the greedy policy
+            P_pi, R_pi = policy_model(T, pi)
+            V = V_new
+            for _ in range(self._k):
+                V = R_pi + self._gamma * (P_pi @ V)
+                V[T.goal_id] = 1.0
+        self._V = T.to_grid(V)
+        return self._V
@@ -33,7 +33,7 @@ if 0:
 print("Running Value Iteration...")
 vi = VI(environment, goal)
 G_opt = vi.calculate_value_function()
-vi.calculate_policy()
+vi_policy = vi.calculate_policy()
 
 # Visualize G*
 plt.figure(figsize=(10, 8))
@@ -49,7 +49,7 @@ print("Saved vi_G_opt.png")
 print("Running MDP...")
 mdp = MDP(environment, goal, gamma=0.99)
 v_opt = mdp.calculate_value_function()
-mdp.calculate_policy()
+mdp_policy = mdp.calculate_policy()
 
 # Visualize v*
 plt.figure(figsize=(10, 8))
@@ -60,6 +60,14 @@ plt.savefig('mdp_v_opt.png', dpi=150, bbox_inches='tight')
 plt.close()
 print("Saved mdp_v_opt.png")
 
+# Monte Carlo evaluation of both policies under the true noise
+# ======================================
+for name, policy in [("VI", vi_policy), ("MDP", mdp_policy)]:
+    stats = environment.rollout_batch(policy, s_ini, n_episodes=100000, max_steps=100, seed=0)
+    print(f"{name} policy, epsilon={epsilon}: success {stats['success_rate']:.3f}, "
+          f"collision {stats['collision_rate']:.3f}, timeout {stats['timeout_rate']:.3f}, "
+          f"mean steps to goal {stats['mean_steps_to_goal']:.1f}")
+
 # Plan visualization for VI
 # ======================================
 print("Generating VI video...")
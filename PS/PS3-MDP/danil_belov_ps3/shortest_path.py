@@ -0,0 +1,125 @@
+import heapq
+import numpy as np
+from utils import *
+from vi import VI, padded_free_mask, shifted
+
+
+class BucketQueueVI(VI):
+
+    def __init__(self,
+                 env: Environment,
+                 goal: tuple,
+                 cell_cost: np.ndarray = None):
+        """
+        Exact deterministic cost-to-go by a single shortest path search backwards from the goal,
+        instead of value iteration sweeps. Same interface as VI, 1e6 for cells that can't reach the goal.
+
+        cell_cost: None for the unit cost l(s,a) = 1 of VI (breadth-first search), or an array of the grid
+            shape with the cost l(s,a) = cell_cost[f(s,a)] >= 0 of entering each cell:
+            integer costs use Dial's bucket queue, float costs Dijkstra's algorithm with a binary heap
+        """
+        super().__init__(env, goal)
+        if cell_cost is not None:
+            cell_cost = np.asarray(cell_cost)
+            assert cell_cost.shape == env.shape, "cell_cost must have the shape of the grid"
+            assert np.all(cell_cost >= 0), "cell_cost must be non-negative"
+        self._cell_cost = cell_cost
+
+    def calculate_value_function(self, max_iterations: int = 100):
+        """
+        max_iterations is accepted for compatibility with VI and ignored, the search is exact in one pass
+        output:
+        G: optimal cost-to-go, the policy is computed in the same call (see calculate_policy)
+        """
+        # Search on the flattened padded grid: the border cells are blocked, so a move is a fixed
+        # offset of the flat index and never wraps around a row
+        free = padded_free_mask(self._env)
+        W = free.shape[1]
+        offsets = [a[0] * W + a[1] for a in action_space]
+        goal = (self._goal[0] + 1) * W + self._goal[1] + 1
+        if self._cell_cost is None:
+            G = self._bfs(free.ravel(), offsets, goal)
+        else:
+            cost = np.zeros(free.shape, dtype=self._cell_cost.dtype)
+            cost[1:-1, 1:-1] = self._cell_cost
+            if np.issubdtype(cost.dtype, np.integer):
+                G = self._dial(free.ravel(), cost.ravel(), offsets, goal)
+            else:
+                G = self._dijkstra(free.ravel(), cost.ravel(), offsets, goal)
+        self._G = G.reshape(free.shape)[1:-1, 1:-1].copy()
+        self._policy_from_G(free)
+        return self._G
+
+    def calculate_policy(self):
+        """
+        The policy has already been computed together with G*.
+        Ties are broken in action_space order, as in VI.
+        """
+        return self._policy
+
+    def _bfs(self, free, offsets, goal):
+        # unit costs: level-synchronous breadth-first search, one vectorized step per distance
+        G = np.full(free.shape, 1e6)
+        G[goal] = 0.0
+        frontier = np.array([goal])
+        distance = 0
+        while len(frontier):
+            distance += 1
+            nxt = (frontier[:, None] + offsets).ravel()
+            nxt = np.unique(nxt[free[nxt] & (G[nxt] == 1e6)])
+            G[nxt] = distance
+            frontier = nxt
+        return G
+
+    def _dial(self, free, cost, offsets, goal):
+        # integer costs: Dial's algorithm, a circular array of max_cost + 1 buckets of equal distance
+        free, cost = free.tolist(), cost.tolist()
+        n_buckets = max(cost) + 1
+        dist = [-1] * len(free)
+        dist[goal] = 0
+        buckets = [[] for _ in range(n_buckets)]
+        buckets[0].append(goal)
+        n_queued, d = 1, 0
+        while n_queued:
+            bucket = buckets[d % n_buckets]
+            while bucket:
+                n = bucket.pop()
+                n_queued -= 1
+                if dist[n] != d:
+                    continue  # stale entry, n was reached with a lower cost
+                for offset in offsets:
+                    s = n + offset
+                    if free[s] and (dist[s] < 0 or d + cost[n] < dist[s]):
+                        dist[s] = d + cost[n]
+                        buckets[dist[s] % n_buckets].append(s)
+                        n_queued += 1
+            d += 1
+        dist = np.array(dist, dtype=float)
+        return np.where(dist < 0, 1e6, dist)
+
+    def _dijkstra(self, free, cost, offsets, goal):
+        free, cost = free.tolist(), cost.tolist()
+        dist = [np.inf] * len(free)
+        dist[goal] = 0.0
+        queue = [(0.0, goal)]
+        while queue:
+            d, n = heapq.heappop(queue)
+            if d > dist[n]:
+                continue
+            for offset in offsets:
+                s = n + offset
+                if free[s] and d + cost[n] < dist[s]:
+                    dist[s] = d + cost[n]
+                    heapq.heappush(queue, (dist[s], s))
+        dist = np.array(dist)
+        return np.where(np.isinf(dist), 1e6, dist)
+
+    def _policy_from_G(self, free):
+        # argmin_a l(s,a) + G(f(s,a)), 1e6 for actions that can't be executed
+        G = np.zeros(free.shape)
+        G[1:-1, 1:-1] = self._G
+        cost = np.ones(free.shape)
+        if self._cell_cost is not None:
+            cost[1:-1, 1:-1] = self._cell_cost
+        costs = np.stack([np.where(shifted(free, a), shifted(cost, a) + shifted(G, a), 1e6) for a in action_space])
+        self._policy[free[1:-1, 1:-1]] = np.argmin(costs, axis=0).astype(self._policy.dtype)[free[1:-1, 1:-1]]
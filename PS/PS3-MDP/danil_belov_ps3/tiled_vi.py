@@ -0,0 +1,242 @@
+"""
+Out-of-core value iteration: the occupancy grid and the value function are memory mapped .npy files,
+and the sweeps load one tile plus a one cell halo at a time, so the RAM used does not depend on the
+map size:
+    grid_path = npz_to_npy('data_ps3.npz', 'environment', 'environment.npy')
+    vi = TiledVI(grid_path, goal, 'G.npy', tile_size=256)
+    G = vi.calculate_value_function()  # np.memmap backed by G.npy
+Tiles are updated in place, so a tile reads the halo values its neighbour tiles wrote earlier in the
+same sweep (Gauss-Seidel between tiles), and the sweep direction alternates to carry values both ways.
+"""
+
+import zipfile
+import numpy as np
+from abc import ABC, abstractmethod
+from utils import action_space
+
+
+def npz_to_npy(npz_path: str, key: str, npy_path: str, chunk_bytes: int = 1 << 24) -> str:
+    """
+    Stores one array of an .npz archive as an .npy file that can be memory mapped. The archive member is
+    streamed into the memory mapped target chunk_bytes at a time, so the array is never held in RAM.
+    """
+    with zipfile.ZipFile(npz_path) as archive, archive.open(key + '.npy') as member:
+        version = np.lib.format.read_magic(member)
+        if version == (1, 0):
+            shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(member)
+        else:
+            shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(member)
+        assert not dtype.hasobject, "Object arrays can't be memory mapped"
+        target = np.lib.format.open_memmap(npy_path, mode='w+', dtype=dtype, shape=shape,
+                                           fortran_order=fortran_order)
+        # the data is stored in the memory order of the array, so it fills the flat view of the target
+        flat = target.ravel(order='F' if fortran_order else 'C')
+        chunk_items = max(1, chunk_bytes // max(dtype.itemsize, 1))
+        for start in range(0, flat.size, chunk_items):
+            n_bytes = min(chunk_items, flat.size - start) * dtype.itemsize
+            data = member.read(n_bytes)
+            while len(data) < n_bytes:
+                more = member.read(n_bytes - len(data))
+                assert more, f"{npz_path}: {key} is truncated"
+                data += more
+            flat[start:start + len(data) // dtype.itemsize] = np.frombuffer(data, dtype=dtype)
+        target.flush()
+    return npy_path
+
+
+class _TiledSolver(ABC):
+
+    def __init__(self,
+                 grid_path: str,
+                 goal: tuple,
+                 values_path: str,
+                 tile_size: int = 256,
+                 inner_iterations: int = 4,
+                 dtype=np.float32):
+        """
+        grid_path: .npy occupancy grid, cells >= 1 - 1e-4 are obstacles (see Environment)
+        goal is the goal state
+        values_path: .npy file the value function is written to
+        tile_size: side of the square tiles held in memory
+        inner_iterations: sweeps over a tile while it is loaded, before it is written back
+        dtype: storage type of the values
+        """
+        self._grid = np.load(grid_path, mmap_mode='r')
+        self._goal = tuple(goal)
+        self._values_path = values_path
+        self._tile_size = tile_size
+        self._inner_iterations = inner_iterations
+        self._dtype = dtype
+        self._values = None
+        self._policy = None
+
+    @property
+    def shape(self):
+        return self._grid.shape
+
+    def _tiles(self, reverse: bool = False) -> list:
+        H, W = self.shape
+        tiles = [(r, c) for r in range(0, H, self._tile_size) for c in range(0, W, self._tile_size)]
+        return tiles[::-1] if reverse else tiles
+
+    def _load(self, r: int, c: int, fill: float):
+        """
+        The tile at (r, c) with its halo: free mask and values of shape (h + 2, w + 2), cells outside
+        the grid are blocked and hold fill
+        """
+        H, W = self.shape
+        h, w = min(self._tile_size, H - r), min(self._tile_size, W - c)
+        r0, r1, c0, c1 = max(r - 1, 0), min(r + h + 1, H), max(c - 1, 0), min(c + w + 1, W)
+        free = np.zeros((h + 2, w + 2), dtype=bool)
+        values = np.full((h + 2, w + 2), fill, dtype=self._dtype)
+        inner = (slice(r0 - r + 1, r1 - r + 1), slice(c0 - c + 1, c1 - c + 1))
+        free[inner] = self._grid[r0:r1, c0:c1] < 1.0 - 1e-4
+        values[inner] = self._values[r0:r1, c0:c1]
+        return free, values, (slice(r, r + h), slice(c, c + w))
+
+    def _goal_in_tile(self, tile: tuple):
+        """Position of the goal relative to the first inner cell of the tile, None if not in the tile or its halo"""
+        i, j = self._goal[0] - tile[0].start, self._goal[1] - tile[1].start
+        if -1 <= i <= tile[0].stop - tile[0].start and -1 <= j <= tile[1].stop - tile[1].start:
+            return i, j
+        return None
+
+    @staticmethod
+    def _inner(goal: tuple, shape: tuple) -> bool:
+        return goal is not None and 0 <= goal[0] < shape[0] and 0 <= goal[1] < shape[1]
+
+    def _initialize(self, obstacle_value: float, free_value: float, goal_value: float):
+        self._values = np.lib.format.open_memmap(self._values_path, mode='w+', dtype=self._dtype, shape=self.shape)
+        for r, c in self._tiles():
+            tile = (slice(r, r + self._tile_size), slice(c, c + self._tile_size))
+            self._values[tile] = np.where(self._grid[tile] < 1.0 - 1e-4, free_value, obstacle_value)
+        self._values[self._goal] = goal_value
+
+    @abstractmethod
+    def _backup(self, free: np.ndarray, values: np.ndarray, goal: tuple) -> np.ndarray:
+        """Bellman backup of the inner cells of a loaded tile, shape (h, w)"""
+
+    @abstractmethod
+    def _greedy_action(self, free: np.ndarray, values: np.ndarray, goal: tuple) -> np.ndarray:
+        """Best action of the inner cells of a loaded tile, shape (h, w)"""
+
+    def _sweeps(self, max_iterations: int, fill: float, name: str):
+        for iteration in range(max_iterations):
+            any_changed = False
+            for r, c in self._tiles(reverse=iteration % 2 == 1):
+                free, values, tile = self._load(r, c, fill)
+                goal = self._goal_in_tile(tile)
+                old = values[1:-1, 1:-1].copy()
+                for _ in range(self._inner_iterations):
+                    values[1:-1, 1:-1] = np.where(free[1:-1, 1:-1], self._backup(free, values, goal),
+                                                  values[1:-1, 1:-1])
+                any_changed |= not np.allclose(old, values[1:-1, 1:-1], atol=1e-6)
+                self._values[tile] = values[1:-1, 1:-1]
+            if not any_changed:
+                print(f"{name} converged after {iteration + 1} sweeps")
+                break
+        self._values.flush()
+        return self._values
+
+    def calculate_policy(self, policy_path: str, fill: float):
+        """
+        Writes the greedy policy to policy_path (.npy, int8), tile by tile
+        """
+        self._policy = np.lib.format.open_memmap(policy_path, mode='w+', dtype='b', shape=self.shape)
+        for r, c in self._tiles():
+            free, values, tile = self._load(r, c, fill)
+            self._policy[tile] = np.where(free[1:-1, 1:-1], self._greedy_action(free, values, self._goal_in_tile(tile)), 0)
+        self._policy.flush()
+        return self._policy
+
+    def policy(self, state: tuple) -> int:
+        """
+        returns the action according to the policy
+        """
+        return self._policy[state]
+
+
+class TiledVI(_TiledSolver):
+    """
+    Deterministic value iteration (see VI) over memory mapped arrays: l(s,a) = 1, 1e6 for actions that
+    can't be executed, G*(goal) = 0.
+    """
+
+    def _costs(self, free, values):
+        # obstacles and cells outside the grid hold 1e6 - 1, so that blocked actions cost exactly 1e6
+        padded = np.where(free, values, self._dtype(1e6 - 1))
+        h, w = values.shape[0] - 2, values.shape[1] - 2
+        return np.stack([padded[1 + a[0]:1 + a[0] + h, 1 + a[1]:1 + a[1] + w] for a in action_space]) + self._dtype(1.0)
+
+    def _backup(self, free, values, goal):
+        G = self._costs(free, values).min(axis=0)
+        if self._inner(goal, G.shape):
+            G[goal] = 0.0
+        return G
+
+    def _greedy_action(self, free, values, goal):
+        return np.argmin(self._costs(free, values), axis=0)
+
+    def calculate_value_function(self, max_iterations: int = 1000):
+        """
+        output:
+        G: optimal cost-to-go, memory mapped from values_path
+        """
+        self._initialize(obstacle_value=1e6, free_value=1e6, goal_value=0.0)
+        return self._sweeps(max_iterations, 1e6, "Tiled VI")
+
+    def calculate_policy(self, policy_path: str):
+        return super().calculate_policy(policy_path, 1e6)
+
+
+class TiledMDP(_TiledSolver):
+
+    def __init__(self,
+                 grid_path: str,
+                 goal: tuple,
+                 values_path: str,
+                 gamma: float = 0.99,
+                 epsilon: float = 0.4,
+                 **kwargs):
+        """
+        Stochastic value iteration (see MDP) over memory mapped arrays: reward 1 for reaching the goal,
+        -1 and no future value for outcomes into obstacles or out of bounds, v*(goal) = 1.
+        gamma is the discount factor
+        epsilon is the noise of the transitions (see Environment.probabilistic_transition_function)
+        """
+        super().__init__(grid_path, goal, values_path, **kwargs)
+        self._gamma = gamma
+        self._outcome_probs = np.full((len(action_space), len(action_space)), epsilon / 3)
+        np.fill_diagonal(self._outcome_probs, 1 - epsilon)
+
+    def _q_values(self, free, values, goal):
+        h, w = values.shape[0] - 2, values.shape[1] - 2
+        returns = np.empty((len(action_space), h, w), dtype=self._dtype)
+        for k, outcome in enumerate(action_space):
+            view = (slice(1 + outcome[0], 1 + outcome[0] + h), slice(1 + outcome[1], 1 + outcome[1] + w))
+            # r(s') + gamma * v(s') of every outcome, -1 for obstacles and out of bounds
+            returns[k] = np.where(free[view], self._gamma * values[view], -1.0)
+            # the cell from which this outcome reaches the goal also gets the goal reward
+            if goal is not None and self._inner((goal[0] - outcome[0], goal[1] - outcome[1]), (h, w)):
+                returns[k, goal[0] - outcome[0], goal[1] - outcome[1]] += 1.0
+        return np.tensordot(self._outcome_probs, returns, axes=1)
+
+    def _backup(self, free, values, goal):
+        V = self._q_values(free, values, goal).max(axis=0)
+        if self._inner(goal, V.shape):
+            V[goal] = 1.0
+        return V
+
+    def _greedy_action(self, free, values, goal):
+        return np.argmax(self._q_values(free, values, goal), axis=0)
+
+    def calculate_value_function(self, max_iterations: int = 1000):
+        """
+        output:
+        V: optimal value function, memory mapped from values_path
+        """
+        self._initialize(obstacle_value=0.0, free_value=0.0, goal_value=1.0)
+        return self._sweeps(max_iterations, 0.0, "Tiled MDP")
+
+    def calculate_policy(self, policy_path: str):
+        return super().calculate_policy(policy_path, 0.0)
@@ -14,6 +14,60 @@ action_space.append((0,-1))
 action_space.append((1,0))
 action_space.append((0,1))
 
+# Sentinel codes of TransitionTables.neighbors
+OBSTACLE = -1
+OUT_OF_BOUNDS = -2
+
+
+class TransitionTables:
+    def __init__(self, grid: np.ndarray):
+        """
+        Transition model of a grid compiled into flat arrays, built once per grid (see Environment.tables):
+        free: (H, W) True where state_consistency_check passes
+        states: flat index of every free cell, the state ids are the positions in this array
+        index: state id of every flat cell index, OBSTACLE for obstacles
+        neighbors: (S, len(action_space)) state id reached by each move from each state,
+            or OBSTACLE / OUT_OF_BOUNDS
+        """
+        H, W = grid.shape
+        self.shape = grid.shape
+        self.free = grid < 1.0-1e-4
+        self.states = np.flatnonzero(self.free)
+        self.index = np.full(H * W, OBSTACLE)
+        self.index[self.states] = np.arange(len(self.states))
+        i, j = np.unravel_index(self.states, self.shape)
+        self.neighbors = np.full((len(self.states), len(action_space)), OUT_OF_BOUNDS)
+        for a_idx, a in enumerate(action_space):
+            ni, nj = i + a[0], j + a[1]
+            in_bounds = (ni >= 0) & (ni < H) & (nj >= 0) & (nj < W)
+            self.neighbors[in_bounds, a_idx] = self.index[ni[in_bounds] * W + nj[in_bounds]]
+        self._outcome_probs = {}
+
+    def outcome_probs(self, epsilon: float) -> np.ndarray:
+        """
+        (len(action_space), len(action_space)) array, row a holds the probability of executing each move
+        when a is commanded: 1 - epsilon for a itself, epsilon/3 for the others. Cached per epsilon.
+        """
+        if epsilon not in self._outcome_probs:
+            probs = np.full((len(action_space), len(action_space)), epsilon/3)
+            np.fill_diagonal(probs, 1-epsilon)
+            self._outcome_probs[epsilon] = probs
+        return self._outcome_probs[epsilon]
+
+    def state_id(self, s) -> int:
+        """state id of the cell s, OBSTACLE for obstacles"""
+        return self.index[s[0] * self.shape[1] + s[1]]
+
+    def to_grid(self, values: np.ndarray, fill=0) -> np.ndarray:
+        """Scatters per-state values back to the grid, obstacles get fill"""
+        grid = np.full(self.shape[0] * self.shape[1], fill, dtype=values.dtype)
+        grid[self.states] = values
+        return grid.reshape(self.shape)
+
+    def from_grid(self, grid: np.ndarray) -> np.ndarray:
+        return grid.reshape(-1)[self.states]
+
+
 class Environment:
     def __init__(self,
                  env: np.ndarray,
@@ -30,11 +84,27 @@ class Environment:
         self._epsilon = epsilon
         self._state = initial_state
         self._goal = goal
+        self._tables = None
 
     @property
     def shape(self):
         return self._env.shape
 
+    @property
+    def epsilon(self):
+        return self._epsilon
+
+    def set_grid(self, env: np.ndarray):
+        """Replaces the grid, the transition tables are rebuilt on their next use"""
+        self._env = env
+        self._tables = None
+
+    def tables(self) -> TransitionTables:
+        """The compiled transition tables of the grid, built on first use"""
+        if self._tables is None:
+            self._tables = TransitionTables(self._env)
+        return self._tables
+
     def reset(self, initial_state: tuple):
         self._state =  initial_state
         return self._state
@@ -55,14 +125,15 @@ class Environment:
 
     def state_consistency_check(self,s):
         """Checks wether or not the proposed state is a valid state, i.e. is in colision or our of bounds"""
-        # check for collision
         if s[0] < 0 or s[1] < 0 or s[0] >= self._env.shape[0] or s[1] >= self._env.shape[1] :
             #print('out of bonds')
             return False
-        if self._env[s] >= 1.0-1e-4:
-            #print('Obstacle')
-            return False
-        return True
+        # collision, from the free mask of the compiled tables
+        return bool(self.tables().free[s[0], s[1]])
+
+    def free_mask(self):
+        """Boolean array of the grid shape, True where state_consistency_check passes"""
+        return self.tables().free
 
 
     def transition_function(self,s,a):
@@ -75,9 +146,7 @@ class Environment:
         True if correctly propagated
         False if this action can't be executed
         """
-        snew = np.array(s) + np.array(a)
-        snew = tuple(snew)
-        #print('snew',snew)
+        snew = (s[0] + a[0], s[1] + a[1])
         if self.state_consistency_check(snew):
             return snew, True
         return s, False
@@ -95,17 +164,9 @@ class Environment:
         """
         if epsilon == None:
             epsilon = self._epsilon
-        state_propagated_list = []
-        prob_list = []
-        for action in action_space:
-            snew = np.array(s) + np.array(action)
-            snew = tuple(snew)
-            # This is to ensure that p(Sigma)=1
-            prob = epsilon/3
-            if action == a:
-                prob = 1-epsilon
-            state_propagated_list.append(snew)
-            prob_list.append(prob)
+        state_propagated_list = [(s[0] + action[0], s[1] + action[1]) for action in action_space]
+        # This is to ensure that p(Sigma)=1
+        prob_list = self.tables().outcome_probs(epsilon)[action_space.index(tuple(a))].tolist()
         # There is no state consistency, it should be done externally when asigning the reward
         return state_propagated_list, prob_list
 
@@ -122,10 +183,14 @@ class Environment:
         """
         if epsilon == None:
             epsilon = self._epsilon
-        state_list, prob_list = self.probabilistic_transition_function(self._state,a,epsilon)
-        index = np.random.choice(len(prob_list),p=prob_list)
-        state = state_list[index]
-        safe_propagation = self.state_consistency_check(state_list[index])
+        tables = self.tables()
+        index = np.random.choice(len(action_space), p=tables.outcome_probs(epsilon)[action_space.index(tuple(a))])
+        state = (self._state[0] + action_space[index][0], self._state[1] + action_space[index][1])
+        state_id = tables.state_id(self._state) if self.state_consistency_check(self._state) else OBSTACLE
+        if state_id >= 0:
+            safe_propagation = bool(tables.neighbors[state_id, index] >= 0)
+        else:
+            safe_propagation = self.state_consistency_check(state)
         reward = 0.0
         success = False
         if not safe_propagation:
@@ -136,3 +201,57 @@ class Environment:
         self._state = state
         return state, reward, safe_propagation, success
 
+    def rollout_batch(self, policy, start=None, n_episodes=100000, max_steps=100, epsilon=None, seed=None):
+        """Monte Carlo evaluation of a policy: n_episodes independent agents are simulated in lock-step,
+        with the same dynamics and termination as step (an episode ends on a collision or at the goal)
+        policy: array of the grid shape with the action index of every state
+        start: initial state of every agent, a tuple or an array of shape (n_episodes, 2). Defaults to the current state
+        epsilon: noise of the transitions, defaults to the one of the environment
+
+        Output: dict with the per-episode arrays success, collision and steps (steps until the episode ended,
+        max_steps for timeouts) and the summary success_rate, collision_rate, timeout_rate and
+        mean_steps_to_goal
+        """
+        if epsilon == None:
+            epsilon = self._epsilon
+        if start is None:
+            start = self._state
+        rng = np.random.default_rng(seed)
+        tables = self.tables()
+        goal_id = tables.state_id(self._goal)
+        actions = tables.from_grid(np.asarray(policy)).astype(np.intp)
+        cumulative_probs = np.cumsum(tables.outcome_probs(epsilon), axis=1)
+
+        start = np.broadcast_to(np.asarray(start), (n_episodes, 2))
+        state = tables.index[start[:, 0] * self.shape[1] + start[:, 1]]
+        assert np.all(state >= 0), "Start states must be free cells"
+        success = state == goal_id
+        collision = np.zeros(n_episodes, dtype=bool)
+        steps = np.full(n_episodes, max_steps)
+        steps[success] = 0
+        active = np.flatnonzero(~success)
+        for step in range(1, max_steps + 1):
+            if len(active) == 0:
+                break
+            # sample the executed move of every agent from the cumulative probabilities of its commanded action
+            u = rng.random(len(active))
+            outcome = (u[:, None] >= cumulative_probs[actions[state[active]]]).sum(axis=1)
+            outcome = np.minimum(outcome, len(action_space) - 1)
+            state_next = tables.neighbors[state[active], outcome]
+            collided = state_next < 0
+            reached = state_next == goal_id
+            collision[active[collided]] = True
+            success[active[reached]] = True
+            steps[active[collided | reached]] = step
+            state[active] = np.where(collided, state[active], state_next)
+            active = active[~(collided | reached)]
+
+        return {
+            'success': success,
+            'collision': collision,
+            'steps': steps,
+            'success_rate': float(np.mean(success)),
+            'collision_rate': float(np.mean(collision)),
+            'timeout_rate': float(np.mean(~success & ~collision)),
+            'mean_steps_to_goal': float(np.mean(steps[success])) if success.any() else np.nan,
+        }
@@ -2,21 +2,46 @@ import numpy as np
 from utils import *
 
 
+def padded_free_mask(env: Environment) -> np.ndarray:
+    """
+    Free cells of the grid with a one cell border of out-of-bounds cells around it,
+    so that every action is a plain slice of the padded array. Shape: (H + 2, W + 2).
+    """
+    free = np.zeros((env.shape[0] + 2, env.shape[1] + 2), dtype=bool)
+    free[1:-1, 1:-1] = env.free_mask()
+    return free
+
+
+def shifted(padded: np.ndarray, a: tuple) -> np.ndarray:
+    """
+    View of a padded (..., H + 2, W + 2) array holding at (..., i, j) the value of the cell (i, j) + a.
+    """
+    H, W = padded.shape[-2] - 2, padded.shape[-1] - 2
+    return padded[..., 1 + a[0]:1 + a[0] + H, 1 + a[1]:1 + a[1] + W]
+
+
 class VI:
+    ENGINES = ("array", "loop")
+
     def __init__(self,
                  env: Environment,
-                 goal: tuple):
+                 goal: tuple,
+                 engine: str = "array"):
         """
         env is the grid enviroment, as defined in utils
         goal is the goal state
+        engine is "array" (whole-grid Bellman backups with numpy) or "loop" (cell by cell reference
+        implementation), both give identical results
         """
+        assert engine in VI.ENGINES, f"Unknown engine: {engine}"
         self._env = env
         self._goal = goal
+        self._engine = engine
         self._G = np.ones(self._env.shape)*1e2
         self._policy = np.zeros(self._env.shape, 'b') #type byte (or numpy.int8)
 
 
-    def calculate_value_function(self):
+    def calculate_value_function(self, max_iterations: int = 100):
         """
         env is the grid enviroment
         goal is the goal state
@@ -32,12 +57,14 @@ class VI:
         - f(s,a) is the deterministic transition function
         - G*(goal) = 0 (terminal state)
         """
+        if self._engine == "array":
+            return self._calculate_value_function_array(max_iterations)
+
         # Initialize: G*(goal) = 0, all other states = large value
         self._G = np.ones(self._env.shape) * 1e6
         self._G[self._goal] = 0.0
         
         # Value Iteration: iterate until convergence
-        max_iterations = 100
         for iteration in range(max_iterations):
             G_new = np.copy(self._G)
             
@@ -92,6 +119,9 @@ class VI:
         This selects the action that minimizes the immediate cost plus the 
         optimal cost-to-go from the next state.
         """
+        if self._engine == "array":
+            return self._calculate_policy_array()
+
         # Calculate optimal policy from G*
         for i in range(self._env.shape[0]):
             for j in range(self._env.shape[1]):
@@ -121,6 +151,43 @@ class VI:
         
         return self._policy
         
+    def _padded_values(self, G: np.ndarray, free: np.ndarray, out: np.ndarray) -> np.ndarray:
+        # Obstacles and the border hold 1e6 - 1, so that l(s,a) + G(f(s,a)) of an action that can't be
+        # executed is exactly the 1e6 of the loop engine and no per-action masking is needed
+        np.copyto(out[1:-1, 1:-1], np.where(free[1:-1, 1:-1], G, 1e6 - 1))
+        return out
+
+    def _calculate_value_function_array(self, max_iterations: int):
+        # Same sweeps as the loop engine, each one computed as a minimum of shifted arrays
+        free = padded_free_mask(self._env)
+        update = free[1:-1, 1:-1].copy()
+        update[self._goal] = False
+        padded = np.full(free.shape, 1e6 - 1)
+        min_next = np.empty(self._env.shape)
+
+        self._G = np.ones(self._env.shape) * 1e6
+        self._G[self._goal] = 0.0
+        for iteration in range(max_iterations):
+            self._padded_values(self._G, free, padded)
+            np.minimum(shifted(padded, action_space[0]), shifted(padded, action_space[1]), out=min_next)
+            for a in action_space[2:]:
+                np.minimum(min_next, shifted(padded, a), out=min_next)
+            G_new = np.where(update, min_next + 1.0, self._G)
+            if np.allclose(self._G, G_new, atol=1e-6):
+                print(f"VI converged after {iteration + 1} iterations")
+                break
+            self._G = G_new
+        return self._G
+
+    def _calculate_policy_array(self):
+        free = padded_free_mask(self._env)
+        padded = self._padded_values(self._G, free, np.full(free.shape, 1e6 - 1))
+        costs = np.stack([shifted(padded, a) + 1.0 for a in action_space])
+        # argmin returns the first of equal costs, like the strict comparison of the loop engine
+        best_action = np.argmin(costs, axis=0).astype(self._policy.dtype)
+        self._policy[free[1:-1, 1:-1]] = best_action[free[1:-1, 1:-1]]
+        return self._policy
+
     def policy(self,state:tuple) -> int:
         """
         returns the action according to the policy